@@ -1,15 +1,22 @@
 from fastapi import FastAPI, Request, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse, Response
 import json
+import hashlib
+import uuid
 import docker
-from docker.types import DeviceRequest
 import time
 import os
-import requests
+import httpx
 import redis.asyncio as redis
 import asyncio
+import random
+import math
+import heapq
+import threading
+import calendar
 from datetime import datetime
 from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
 import pynvml
 import psutil
 import logging
@@ -18,7 +25,45 @@ import logging
 
 
 # print(f'** connecting to redis on port: {os.getenv("REDIS_PORT")} ... ')
-r = redis.Redis(host="redis", port=int(os.getenv("REDIS_PORT", 6379)), db=0)
+# every redis access in the backend goes through this pool and the redis_* helpers below,
+# always awaited and batched into one pipeline whenever more than one key is touched
+redis_pool = redis.ConnectionPool(
+    host="redis",
+    port=int(os.getenv("REDIS_PORT", 6379)),
+    db=0,
+    max_connections=int(os.getenv("REDIS_MAX_CONNECTIONS", 64)),
+    socket_timeout=float(os.getenv("REDIS_SOCKET_TIMEOUT", 5.0)),
+    socket_connect_timeout=float(os.getenv("REDIS_SOCKET_TIMEOUT", 5.0)),
+    health_check_interval=30
+)
+r = redis.Redis(connection_pool=redis_pool)
+
+def redis_pipeline():
+    return r.pipeline(transaction=False)
+
+async def redis_hgetall_many(keys):
+    pipe = redis_pipeline()
+    for key in keys:
+        pipe.hgetall(key)
+    return await pipe.execute()
+
+async def redis_get_json(key, default=None):
+    res_val = await r.get(key)
+    return json.loads(res_val) if res_val is not None else default
+
+async def redis_wait_ready(timeout=60):
+    start = time.monotonic()
+    while True:
+        try:
+            return await r.ping()
+        except Exception as e:
+            if time.monotonic() - start > timeout:
+                raise
+            print(f'[{datetime.now().strftime("%Y-%m-%d %H:%M:%S")}] [redis_wait_ready] waiting for redis ... {e}')
+            await asyncio.sleep(1.0)
+
+async def redis_close():
+    await redis_pool.disconnect()
 
 LOG_PATH = './logs'
 LOGFILE_CONTAINER = f'{LOG_PATH}/logfile_container_backend.log'
@@ -33,12 +78,16 @@ print(f'** pynvml found GPU: {device_count}')
 logging.info(f'[{datetime.now().strftime("%Y-%m-%d %H:%M:%S")}] [START] pynvml found GPU: {device_count}')
 
 device_uuids = []
+device_handles = []
+device_mem_totals = {}
 for i in range(0,device_count):
     # print(f'1 i {i}')
     handle = pynvml.nvmlDeviceGetHandleByIndex(i)
     # print(f'1 handle {handle}')
     current_uuid = pynvml.nvmlDeviceGetUUID(handle)
     device_uuids.append(current_uuid)
+    device_handles.append(handle)
+    device_mem_totals[current_uuid] = int(pynvml.nvmlDeviceGetMemoryInfo(handle).total)
 
 # print(f'** pynvml found uuids ({len(device_uuids)}): {device_uuids} ')
 
@@ -48,12 +97,15 @@ if not os.path.exists(DEFAULTS_PATH):
     logging.info(f' [START] File missing: {DEFAULTS_PATH}')
 
 with open(DEFAULTS_PATH, "r", encoding="utf-8") as f:
-    defaults_backend = json.load(f)["backend"]
+    defaults_all = json.load(f)
+    defaults_backend = defaults_all["backend"]
     logging.info(f' [START] SUCCESS! Loaded: {DEFAULTS_PATH}')
     DEFAULT_CONTAINER_STATS = defaults_backend['DEFAULT_CONTAINER_STATS']
     logging.info(f' [START] SUCCESS! Loaded DEFAULT_CONTAINER_STATS: {DEFAULT_CONTAINER_STATS}')
     COMPUTE_CAPABILITIES = defaults_backend['compute_capability']
     logging.info(f' [START] SUCCESS! Loaded COMPUTE_CAPABILITIES: {COMPUTE_CAPABILITIES}')
+    METRICS_SCHEMA = defaults_all['metrics']
+    logging.info(f' [START] SUCCESS! Loaded METRICS_SCHEMA version: {METRICS_SCHEMA["version"]}')
 
 
 
@@ -76,90 +128,333 @@ with open(DEFAULTS_PATH, "r", encoding="utf-8") as f:
 
 
 
-async def save_redis(**kwargs):
-    try:
-        if not kwargs:
-            print(f'[{datetime.now().strftime("%Y-%m-%d %H:%M:%S")}] [save_redis] [error] No data')
-            return f'no data'
-        else:
-            print(f'[{datetime.now().strftime("%Y-%m-%d %H:%M:%S")}] [save_redis] kwargs: {kwargs}')
-        if not kwargs["db_name"]:
-            print(f'[{datetime.now().strftime("%Y-%m-%d %H:%M:%S")}] [save_redis] [error] No db_name')
-            return f'no db_name'
-                
-        if not 'vllm_id' in kwargs:            
-            print(f'[{datetime.now().strftime("%Y-%m-%d %H:%M:%S")}] [save_redis] No vllm_id provided. Creating new ...')
-            vllm_id = f'vllm_{str(int(datetime.now().timestamp()))}'
-            print(f'[{datetime.now().strftime("%Y-%m-%d %H:%M:%S")}] [save_redis] ... vllm_id: {vllm_id}')        
-        
-        res_db_list = r.lrange(kwargs["db_name"], 0, -1)
-        if len(res_db_list) > 0:
-            print(f'[{datetime.now().strftime("%Y-%m-%d %H:%M:%S")}] [save_redis] found {len(res_db_list)} entries!')
-            vllm_id_list = [entry for entry in res_db_list if json.loads(entry)["vllm_id"] == kwargs["vllm_id"]]
-            print(f'[{datetime.now().strftime("%Y-%m-%d %H:%M:%S")}] [save_redis] found {len(vllm_id_list)} for {kwargs["vllm_id"]}')
-            
-            if len(vllm_id_list) > 0:
-                print(f'Found {kwargs["vllm_id"]}! Updating')                
-                for entry in res_db_list:
-                    parsed_entry = json.loads(entry)  # Convert JSON string to dictionary
-                    print(f'*** parsed_entry {parsed_entry["vllm_id"]}!')
-                    if parsed_entry["vllm_id"] == kwargs["vllm_id"]:
-                        print(f'found vllm_id {kwargs["vllm_id"]}!')
-                        r.lrem(kwargs["db_name"], 0, entry)
-                        print("entry deleted!")
-                        parsed_entry['ts'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                        print("trying push ...")
-                        r.rpush(kwargs["db_name"], json.dumps(parsed_entry))
-                        print("pushed!")
-            else:                
-                print(f'didnt find {kwargs["vllm_id"]} yet! Creating')
-                redis_data = {
-                    "db_name": kwargs["db_name"],
-                    "vllm_id": kwargs["vllm_id"],
-                    "model": kwargs["model"], 
-                    "ts": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                }    
-                r.rpush(kwargs["db_name"], json.dumps(redis_data))
-                print("created!")
-
-        else:
-            print("no entry found yet .. creating")
-            redis_data = {
-                "db_name": kwargs["db_name"],
-                "vllm_id": vllm_id,
-                "model": kwargs["model"], 
-                "ts": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            }
-            r.rpush(kwargs["db_name"], json.dumps(redis_data))
-            print("created!")
+# vllm instance registry: one hash per instance (vllm:<vllm_id>, every field json encoded)
+# plus one redis set per indexed value (vllm_idx:<field>:<value>). hash and index sets are
+# always changed together inside a lua script, so lookups never see a half written entry
+REGISTRY_INDEXED_FIELDS = ["status", "model", "port", "gpu_uuids", "container_name"]
+
+REGISTRY_UPSERT_LUA = """
+local key = KEYS[1]
+local vllm_id = ARGV[1]
+local fields = cjson.decode(ARGV[2])
+local indexed = cjson.decode(ARGV[3])
+local mode = ARGV[4]
+local exists = redis.call('EXISTS', key)
+if mode == 'create' and exists == 1 then return 0 end
+if mode == 'update' and exists == 0 then return 0 end
+local function index_values(raw)
+    if not raw then return {} end
+    local val = cjson.decode(raw)
+    if val == cjson.null then return {} end
+    if type(val) == 'table' then return val end
+    return {tostring(val)}
+end
+for _, field in ipairs(indexed) do
+    if fields[field] ~= nil then
+        for _, v in ipairs(index_values(redis.call('HGET', key, field))) do
+            redis.call('SREM', 'vllm_idx:' .. field .. ':' .. tostring(v), vllm_id)
+        end
+        for _, v in ipairs(index_values(fields[field])) do
+            redis.call('SADD', 'vllm_idx:' .. field .. ':' .. tostring(v), vllm_id)
+        end
+    end
+end
+for field, raw in pairs(fields) do
+    redis.call('HSET', key, field, raw)
+end
+redis.call('SADD', 'vllm_idx:all', vllm_id)
+return 1
+"""
+
+REGISTRY_DELETE_LUA = """
+local key = KEYS[1]
+local vllm_id = ARGV[1]
+local indexed = cjson.decode(ARGV[2])
+if redis.call('EXISTS', key) == 0 then return 0 end
+for _, field in ipairs(indexed) do
+    local raw = redis.call('HGET', key, field)
+    if raw then
+        local val = cjson.decode(raw)
+        if type(val) ~= 'table' then val = {val} end
+        for _, v in ipairs(val) do
+            if v ~= cjson.null then
+                redis.call('SREM', 'vllm_idx:' .. field .. ':' .. tostring(v), vllm_id)
+            end
+        end
+    end
+end
+redis.call('DEL', key)
+redis.call('SREM', 'vllm_idx:all', vllm_id)
+return 1
+"""
+
+registry_upsert_script = r.register_script(REGISTRY_UPSERT_LUA)
+registry_delete_script = r.register_script(REGISTRY_DELETE_LUA)
+
+def registry_key(vllm_id):
+    return f'vllm:{vllm_id}'
+
+def registry_decode(raw):
+    if not raw:
+        return None
+    return {k.decode(): json.loads(v) for k, v in raw.items()}
+
+async def registry_save(vllm_id, data, mode="upsert"):
+    # mode: "create" fails if the id exists, "update" fails if it doesn't, "upsert" never fails
+    fields = {k: json.dumps(v) for k, v in data.items()}
+    fields["vllm_id"] = json.dumps(vllm_id)
+    fields["ts"] = json.dumps(datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+    res_saved = await registry_upsert_script(keys=[registry_key(vllm_id)], args=[vllm_id, json.dumps(fields), json.dumps(REGISTRY_INDEXED_FIELDS), mode])
+    return bool(res_saved)
+
+async def registry_get(vllm_id):
+    return registry_decode(await r.hgetall(registry_key(vllm_id)))
+
+async def registry_get_many(vllm_ids):
+    res_raw = await redis_hgetall_many([registry_key(vllm_id.decode() if isinstance(vllm_id, bytes) else vllm_id) for vllm_id in vllm_ids])
+    return [entry for entry in (registry_decode(raw) for raw in res_raw) if entry]
+
+async def registry_find(**filters):
+    # {"status": "running", "model": "Qwen/Qwen2.5-1.5B-Instruct"} -> intersection of the index sets
+    if not filters:
+        return await registry_get_many(sorted(await r.smembers('vllm_idx:all')))
+    for field in filters:
+        if field not in REGISTRY_INDEXED_FIELDS:
+            raise ValueError(f'{field} is not indexed, use one of {REGISTRY_INDEXED_FIELDS}')
+    res_ids = await r.sinter([f'vllm_idx:{field}:{val}' for field, val in filters.items()])
+    return await registry_get_many(sorted(res_ids))
+
+async def registry_delete(vllm_id):
+    res_deleted = await registry_delete_script(keys=[registry_key(vllm_id)], args=[vllm_id, json.dumps(REGISTRY_INDEXED_FIELDS)])
+    return bool(res_deleted)
+
+
+
+
+
+
+class RateMeter:
+    """Per-NIC rx/tx byte rates with EWMA smoothing and peak tracking.
+
+    Only sample() advances the counters and it is rate limited, so any number of
+    readers can call sample() or snapshot() without stealing each other's delta.
+    """
+
+    def __init__(self, ewma_tau=10.0, min_interval=0.5):
+        self.ewma_tau = ewma_tau
+        self.min_interval = min_interval
+        self.lock = threading.Lock()
+        self.prev_counters = {}
+        self.prev_ts = None
+        self.nics = {}
+        # peaks of the summed rate, per-nic peaks from different moments don't add up to it
+        self.total_peaks = {"rx_rate_peak": 0.0, "tx_rate_peak": 0.0}
+
+    def sample(self):
+        with self.lock:
+            ts = time.monotonic()
+            if self.prev_ts is not None and ts - self.prev_ts < self.min_interval:
+                return self._snapshot()
+            counters = psutil.net_io_counters(pernic=True)
+            dt = ts - self.prev_ts if self.prev_ts is not None else 0.0
+            # alpha derived from the elapsed time keeps the EWMA correct for irregular sampling
+            alpha = 1 - math.exp(-dt / self.ewma_tau) if dt > 0 else 1.0
+            for nic, nic_counters in counters.items():
+                prev = self.prev_counters.get(nic)
+                nic_stats = self.nics.setdefault(nic, {"rx_rate": 0.0, "tx_rate": 0.0, "rx_rate_ewma": None, "tx_rate_ewma": None, "rx_rate_peak": 0.0, "tx_rate_peak": 0.0})
+                if prev is not None and dt > 0:
+                    # counters can wrap or reset when an interface is recreated
+                    nic_stats["rx_rate"] = max(nic_counters.bytes_recv - prev.bytes_recv, 0) / dt
+                    nic_stats["tx_rate"] = max(nic_counters.bytes_sent - prev.bytes_sent, 0) / dt
+                    if nic_stats["rx_rate_ewma"] is None:
+                        # seed with the first measured rate instead of ramping up from zero
+                        nic_stats["rx_rate_ewma"] = nic_stats["rx_rate"]
+                        nic_stats["tx_rate_ewma"] = nic_stats["tx_rate"]
+                    nic_stats["rx_rate_ewma"] = nic_stats["rx_rate_ewma"] + alpha * (nic_stats["rx_rate"] - nic_stats["rx_rate_ewma"])
+                    nic_stats["tx_rate_ewma"] = nic_stats["tx_rate_ewma"] + alpha * (nic_stats["tx_rate"] - nic_stats["tx_rate_ewma"])
+                    nic_stats["rx_rate_peak"] = max(nic_stats["rx_rate_peak"], nic_stats["rx_rate"])
+                    nic_stats["tx_rate_peak"] = max(nic_stats["tx_rate_peak"], nic_stats["tx_rate"])
+                nic_stats["rx_bytes"] = nic_counters.bytes_recv
+                nic_stats["tx_bytes"] = nic_counters.bytes_sent
+            for nic in list(self.nics):
+                if nic not in counters:
+                    del self.nics[nic]
+            self.prev_counters = counters
+            self.prev_ts = ts
+            res_snapshot = self._snapshot()
+            self.total_peaks["rx_rate_peak"] = max(self.total_peaks["rx_rate_peak"], res_snapshot["total"].get("rx_rate", 0.0))
+            self.total_peaks["tx_rate_peak"] = max(self.total_peaks["tx_rate_peak"], res_snapshot["total"].get("tx_rate", 0.0))
+            res_snapshot["total"].update(self.total_peaks)
+            return res_snapshot
+
+    def snapshot(self):
+        with self.lock:
+            return self._snapshot()
+
+    def _snapshot(self):
+        nics = {nic: {k: (0.0 if v is None else v) for k, v in nic_stats.items()} for nic, nic_stats in self.nics.items()}
+        total = {}
+        for nic, nic_stats in nics.items():
+            if nic == "lo":
+                continue
+            for k, v in nic_stats.items():
+                if k not in self.total_peaks:
+                    total[k] = total.get(k, 0) + v
+        total.update(self.total_peaks)
+        return {"nics": nics, "total": total}
+
+
+net_rate_meter = RateMeter(ewma_tau=float(os.getenv("NETWORK_RATE_EWMA_TAU", 10.0)))
 
+def get_download_speed():
+    try:
+        res_rates = net_rate_meter.sample()
+        download_speed = res_rates["total"].get("rx_rate", 0.0)
+        return {
+            "download_speed": download_speed,
+            "download_speed_kb": download_speed / 1024,
+            "download_speed_mbit_s": (download_speed * 8) / (1024 ** 2),
+            "download_speed_ewma": res_rates["total"].get("rx_rate_ewma", 0.0),
+            "download_speed_peak": res_rates["total"].get("rx_rate_peak", 0.0),
+            "upload_speed": res_rates["total"].get("tx_rate", 0.0),
+            "upload_speed_ewma": res_rates["total"].get("tx_rate_ewma", 0.0),
+            "upload_speed_peak": res_rates["total"].get("tx_rate_peak", 0.0),
+            "bytes_recv": res_rates["total"].get("rx_bytes", 0),
+            "bytes_sent": res_rates["total"].get("tx_bytes", 0),
+            "nics": res_rates["nics"]
+        }
     except Exception as e:
-        print(f'[{datetime.now().strftime("%Y-%m-%d %H:%M:%S")}] [save_redis] [error]: {e}')
-
-
-
+        print(f'[{datetime.now().strftime("%Y-%m-%d %H:%M:%S")}] {e}')
+        logging.info(f'[{datetime.now().strftime("%Y-%m-%d %H:%M:%S")}] [get_download_speed] {e}')
+        return {"download_speed": 0.0, "download_speed_mbit_s": 0.0, "nics": {}}
 
 
 
+# one long-lived docker stats stream per running container, each on its own thread.
+# the streams push a frame about once per second, get_network_info only reads the latest values
+container_net_stats = {}
+container_net_threads = {}
+container_net_lock = threading.Lock()
 
-prev_bytes_recv = 0
-def get_download_speed():
+def stream_container_network(container_id, container_name, stop_event):
     try:
-        global prev_bytes_recv
-        net_io = psutil.net_io_counters()
-        bytes_recv = net_io.bytes_recv
-        download_speed = bytes_recv - prev_bytes_recv
-        prev_bytes_recv = bytes_recv
-        download_speed_kb = download_speed / 1024
-        download_speed_mbit_s = (download_speed * 8) / (1024 ** 2)      
-        bytes_received_mb = bytes_recv
-        return f'download_speed_mbit_s {download_speed_mbit_s} bytes_recv {bytes_recv} download_speed {download_speed} download_speed_kb {download_speed_kb} '
-        # return f'{download_speed_kb:.2f} KB/s (total: {bytes_received_mb:.2f})'
+        prev_rx = None
+        prev_tx = None
+        prev_ts = None
+        stats_stream = client.api.stats(container_id, stream=True, decode=True)
+        for container_stats in stats_stream:
+            if stop_event.is_set():
+                break
+            networks = container_stats.get('networks', {}) or {}
+            rx_bytes = sum(network.get('rx_bytes', 0) for network in networks.values())
+            tx_bytes = sum(network.get('tx_bytes', 0) for network in networks.values())
+            ts = time.monotonic()
+            rx_delta = 0
+            tx_delta = 0
+            rx_rate = 0.0
+            tx_rate = 0.0
+            if prev_ts is not None and ts > prev_ts:
+                # counters reset when the container restarts, treat that as a fresh start
+                rx_delta = max(rx_bytes - prev_rx, 0)
+                tx_delta = max(tx_bytes - prev_tx, 0)
+                rx_rate = rx_delta / (ts - prev_ts)
+                tx_rate = tx_delta / (ts - prev_ts)
+            prev_rx, prev_tx, prev_ts = rx_bytes, tx_bytes, ts
+            with container_net_lock:
+                container_net_stats[container_id] = {
+                    "container": container_name,
+                    "rx_bytes": rx_bytes,
+                    "tx_bytes": tx_bytes,
+                    "rx_delta": rx_delta,
+                    "tx_delta": tx_delta,
+                    "rx_rate": rx_rate,
+                    "tx_rate": tx_rate,
+                    "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                }
     except Exception as e:
-        print(f'[{datetime.now().strftime("%Y-%m-%d %H:%M:%S")}] {e}')
-        return f'download error: {e}'
-
-
+        print(f'[{datetime.now().strftime("%Y-%m-%d %H:%M:%S")}] [stream_container_network] {container_name} {e}')
+        logging.info(f'[{datetime.now().strftime("%Y-%m-%d %H:%M:%S")}] [stream_container_network] {container_name} {e}')
+    finally:
+        # the stream ends on its own when the container stops or is removed. after a restart a
+        # new thread may already own the entry, only the current owner cleans it up
+        with container_net_lock:
+            if container_net_threads.get(container_id, (None, None))[0] is threading.current_thread():
+                container_net_stats.pop(container_id, None)
+                container_net_threads.pop(container_id, None)
+
+# container inventory kept current by one docker events subscription, reconciled periodically
+INVENTORY_EVENTS = ["create", "start", "stop", "die", "destroy", "pause", "unpause", "rename", "health_status"]
+container_inventory = {}
+container_inventory_lock = threading.Lock()
+container_inventory_reconciled = 0.0
+
+def inventory_name(container_attrs):
+    return container_attrs.get("Name", "").lstrip("/")
+
+def inventory_refresh(container_id):
+    try:
+        container_attrs = client.api.inspect_container(container_id)
+        with container_inventory_lock:
+            container_inventory[container_attrs["Id"]] = container_attrs
+    except docker.errors.NotFound:
+        with container_inventory_lock:
+            container_inventory.pop(container_id, None)
+
+def inventory_reconcile():
+    global container_inventory_reconciled
+    res_inventory = {c.id: c.attrs for c in client.containers.list(all=True)}
+    with container_inventory_lock:
+        container_inventory.clear()
+        container_inventory.update(res_inventory)
+    container_inventory_reconciled = time.monotonic()
+
+def inventory_watch_events():
+    while True:
+        try:
+            for event in client.events(decode=True, filters={"type": "container"}):
+                # health_status arrives as "health_status: healthy"
+                action = event.get("Action", "").split(":")[0]
+                if action not in INVENTORY_EVENTS:
+                    continue
+                if action == "destroy":
+                    with container_inventory_lock:
+                        container_inventory.pop(event["id"], None)
+                else:
+                    inventory_refresh(event["id"])
+                if action in ("start", "die", "destroy"):
+                    collector_trigger_threadsafe("inventory")
+        except Exception as e:
+            print(f'[{datetime.now().strftime("%Y-%m-%d %H:%M:%S")}] [inventory_watch_events] {e}')
+        # events missed while reconnecting are picked up by the reconcile
+        time.sleep(1.0)
+        inventory_reconcile()
+
+def get_container_list(all=True):
+    with container_inventory_lock:
+        res_container_list = list(container_inventory.values())
+    if all:
+        return res_container_list
+    return [c for c in res_container_list if c["State"]["Status"] == "running"]
+
+def sync_inventory():
+    if time.monotonic() - container_inventory_reconciled > float(COLLECTOR_CONFIG["inventory_reconcile"]):
+        inventory_reconcile()
+    return sync_network_subscriptions()
+
+def sync_network_subscriptions():
+    running_containers = {c["Id"]: inventory_name(c) for c in get_container_list(all=False)}
+    with container_net_lock:
+        for container_id, (thread, stop_event) in list(container_net_threads.items()):
+            if container_id not in running_containers:
+                stop_event.set()
+        for container_id, container_name in running_containers.items():
+            if container_id in container_net_threads:
+                continue
+            stop_event = threading.Event()
+            thread = threading.Thread(target=stream_container_network, args=(container_id, container_name, stop_event), name=f'net_{container_name}', daemon=True)
+            container_net_threads[container_id] = (thread, stop_event)
+            thread.start()
+    return len(running_containers)
 
 def get_network_info():
     network_info = []
@@ -168,22 +463,32 @@ def get_network_info():
         network_info.append({
             "container": f'all',
             "info": "infoblabalba",            
-            "current_dl": f'{current_total_dl}',
+            "current_dl": f'{current_total_dl["download_speed_mbit_s"]:.2f} Mbit/s',
+            "rx_bytes": current_total_dl.get("bytes_recv", 0),
+            "tx_bytes": current_total_dl.get("bytes_sent", 0),
+            "rx_rate": current_total_dl.get("download_speed", 0.0),
+            "tx_rate": current_total_dl.get("upload_speed", 0.0),
+            "rx_rate_ewma": current_total_dl.get("download_speed_ewma", 0.0),
+            "tx_rate_ewma": current_total_dl.get("upload_speed_ewma", 0.0),
+            "rx_rate_peak": current_total_dl.get("download_speed_peak", 0.0),
+            "tx_rate_peak": current_total_dl.get("upload_speed_peak", 0.0),
             "timestamp": str(datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
         })
-        res_container_list = client.containers.list(all=True)
-        for container in res_container_list:
-            container_stats = container.stats(stream=False)
-            networks = container_stats.get('networks', {})
-            rx_bytes = 0
-            if networks:
-                rx_bytes = sum(network.get('rx_bytes', 0) for network in networks.values())
-
+        for nic, nic_stats in sorted(current_total_dl["nics"].items()):
+            network_info.append({
+                "container": f'nic:{nic}',
+                "info": "nic",
+                "current_dl": f'{nic_stats["rx_rate"] * 8 / (1024 ** 2):.2f} Mbit/s',
+                "timestamp": str(datetime.now().strftime("%Y-%m-%d %H:%M:%S")),
+                **nic_stats
+            })
+        with container_net_lock:
+            current_container_stats = list(container_net_stats.values())
+        for container_stats in sorted(current_container_stats, key=lambda c: c["container"]):
             network_info.append({
-                "container": container.name,
                 "info": "infoblabalba",
-                "current_dl": str(rx_bytes),
-                "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                "current_dl": str(container_stats["rx_bytes"]),
+                **container_stats
             })
    
         return network_info
@@ -192,345 +497,421 @@ def get_network_info():
         logging.info(f'[{datetime.now().strftime("%Y-%m-%d %H:%M:%S")}] [get_network_info] {e}')
         return network_info
 
-async def redis_timer_network():
-    while True:
-        try:
-            current_network_info = get_network_info()
-            res_db_network = await r.get('db_network')
-            if res_db_network is not None:
-                db_network = json.loads(res_db_network)
-                updated_network_data = []
-                for net_info_obj in current_network_info:
-                    update_data = {
-                        "container": str(net_info_obj["container"]),
-                        "info": str(net_info_obj["info"]),
-                        "current_dl": str(net_info_obj["current_dl"]),
-                        "timestamp": str(net_info_obj["timestamp"]),
-                    }
-                    updated_network_data.append(update_data)
-                await r.set('db_network', json.dumps(updated_network_data))
-            else:
-                updated_network_data = []
-                for net_info_obj in current_network_info:
-                    update_data = {
-                        "container": str(net_info_obj["container"]),
-                        "info": str(net_info_obj["info"]),
-                        "current_dl": str(net_info_obj["current_dl"]),
-                        "timestamp": str(net_info_obj["timestamp"]),
-                    }
-                    updated_network_data.append(update_data)
-                    # print(f'[network] 2 updated_network_data: {updated_network_data}')
-                await r.set('db_network', json.dumps(updated_network_data))
-            await asyncio.sleep(1.0)
-        except Exception as e:
-            print(f'[{datetime.now().strftime("%Y-%m-%d %H:%M:%S")}] Error: {e}')
-            logging.info(f'[{datetime.now().strftime("%Y-%m-%d %H:%M:%S")}] [redis_timer_network] {e}')
-            await asyncio.sleep(1.0)
-
-
-
-
+def write_network_info(pipe, current_network_info, ts):
+    updated_network_data = []
+    for net_info_obj in current_network_info:
+        update_data = {
+            "container": str(net_info_obj["container"]),
+            "info": str(net_info_obj["info"]),
+            "current_dl": str(net_info_obj["current_dl"]),
+            "rx_rate": float(net_info_obj.get("rx_rate", 0)),
+            "tx_rate": float(net_info_obj.get("tx_rate", 0)),
+            "rx_rate_ewma": float(net_info_obj.get("rx_rate_ewma", net_info_obj.get("rx_rate", 0))),
+            "tx_rate_ewma": float(net_info_obj.get("tx_rate_ewma", net_info_obj.get("tx_rate", 0))),
+            "rx_rate_peak": float(net_info_obj.get("rx_rate_peak", net_info_obj.get("rx_rate", 0))),
+            "tx_rate_peak": float(net_info_obj.get("tx_rate_peak", net_info_obj.get("tx_rate", 0))),
+            "timestamp": str(net_info_obj["timestamp"]),
+        }
+        updated_network_data.append(update_data)
+        history_add(pipe, "network", net_info_obj["container"], net_info_obj, ts)
+    pipe.set('db_network', json.dumps(updated_network_data))
+    telemetry_publish(pipe, "network", updated_network_data, "container")
+
+
+
+
+
+
+# the partition list only changes on mount/unmount, so it is cached and refreshed
+# when /proc/self/mounts changes. io counters are per device and turned into rates
+# against the previous sample, free space gets a smoothed change rate and a time-to-full
+MOUNTS_PATH = "/proc/self/mounts"
+DISK_FREE_RATE_EWMA_ALPHA = 0.3
+DISK_WATCH_MOUNTPOINTS = defaults_backend["collector"]["disk_watch_mountpoints"]
+disk_partitions_cache = {"mounts_sig": None, "partitions": []}
+disk_io_prev = {"ts": None, "counters": {}}
+disk_free_prev = {}
+
+def get_disk_partitions():
+    try:
+        with open(MOUNTS_PATH, "rb") as f:
+            mounts_sig = hash(f.read())
+    except Exception:
+        # no procfs, fall back to re-enumerating every time
+        mounts_sig = None
+    if mounts_sig is None or mounts_sig != disk_partitions_cache["mounts_sig"]:
+        partitions = []
+        processed_devices = set()
+        for partition in psutil.disk_partitions(all=False):
+            # bind mounts share their device with the host root, watched mountpoints like /models are kept anyway
+            if partition.device in processed_devices and partition.mountpoint not in DISK_WATCH_MOUNTPOINTS:
+                continue
+            processed_devices.add(partition.device)
+            partitions.append({
+                "device": str(partition.device),
+                "mountpoint": str(partition.mountpoint),
+                "fstype": str(partition.fstype),
+                "opts": str(partition.opts),
+                # disk_io_counters(perdisk=True) is keyed by kernel name, /dev/mapper/x -> dm-0
+                "io_key": os.path.basename(os.path.realpath(partition.device))
+            })
+        disk_partitions_cache["partitions"] = partitions
+        for mountpoint in list(disk_free_prev):
+            if mountpoint not in [p["mountpoint"] for p in partitions]:
+                del disk_free_prev[mountpoint]
+        disk_partitions_cache["mounts_sig"] = mounts_sig
+        logging.info(f'[{datetime.now().strftime("%Y-%m-%d %H:%M:%S")}] [get_disk_partitions] refreshed {len(partitions)} partitions')
+    return disk_partitions_cache["partitions"]
+
+def get_disk_io_rates():
+    io_rates = {}
+    try:
+        ts = time.monotonic()
+        counters = psutil.disk_io_counters(perdisk=True) or {}
+        dt = ts - disk_io_prev["ts"] if disk_io_prev["ts"] is not None else 0
+        for io_key, io_counters in counters.items():
+            prev = disk_io_prev["counters"].get(io_key)
+            io_rates[io_key] = {"read_count": io_counters.read_count, "write_count": io_counters.write_count, "read_bytes_rate": 0.0, "write_bytes_rate": 0.0, "read_iops": 0.0, "write_iops": 0.0}
+            if prev is not None and dt > 0:
+                io_rates[io_key]["read_bytes_rate"] = max(io_counters.read_bytes - prev.read_bytes, 0) / dt
+                io_rates[io_key]["write_bytes_rate"] = max(io_counters.write_bytes - prev.write_bytes, 0) / dt
+                io_rates[io_key]["read_iops"] = max(io_counters.read_count - prev.read_count, 0) / dt
+                io_rates[io_key]["write_iops"] = max(io_counters.write_count - prev.write_count, 0) / dt
+        disk_io_prev["ts"] = ts
+        disk_io_prev["counters"] = counters
+    except Exception as e:
+        print(f'[ERROR] [get_disk_io_rates] Disk I/O statistics not available on this system {e}')
+    return io_rates
+
+def get_disk_free_rate(mountpoint, free_bytes):
+    # negative while the disk fills up, eta_full is only set in that case
+    ts = time.monotonic()
+    prev = disk_free_prev.get(mountpoint)
+    free_rate = 0.0
+    if prev is not None and ts > prev["ts"]:
+        current_rate = (free_bytes - prev["free_bytes"]) / (ts - prev["ts"])
+        free_rate = prev["free_rate"] + DISK_FREE_RATE_EWMA_ALPHA * (current_rate - prev["free_rate"])
+    disk_free_prev[mountpoint] = {"ts": ts, "free_bytes": free_bytes, "free_rate": free_rate}
+    eta_full = free_bytes / -free_rate if free_rate < 0 else None
+    return free_rate, eta_full
 
 def get_disk_info():
     try:
         disk_info = []
-        partitions = psutil.disk_partitions(all=False)
-        processed_devices = set()
-        for partition in partitions:
-            device = partition.device
-            if device not in processed_devices:
-                processed_devices.add(device)
-                current_disk_info = {}
-                try:                
-                    current_disk_info['device'] = str(partition.device)
-                    current_disk_info['mountpoint'] = str(partition.mountpoint)
-                    current_disk_info['fstype'] = str(partition.fstype)
-                    current_disk_info['opts'] = str(partition.opts)
-                    
-                    disk_usage = psutil.disk_usage(partition.mountpoint)
-                    current_disk_info['usage_total'] = f'{disk_usage.total / (1024**3):.2f} GB'
-                    current_disk_info['usage_used'] = f'{disk_usage.used / (1024**3):.2f} GB'
-                    current_disk_info['usage_free'] = f'{disk_usage.free / (1024**3):.2f} GB'
-                    current_disk_info['usage_percent'] = f'{disk_usage.percent}%'
-                    
-                except Exception as e:
-                    print(f'[ERROR] [get_disk_info] Usage: [Permission denied] {e}')
-                    pass
-                
-                try:                
-                    io_stats = psutil.disk_io_counters()
-                    current_disk_info['io_read_count'] = str(io_stats.read_count)
-                    current_disk_info['io_write_count'] = str(io_stats.write_count)
-                    
-                except Exception as e:
-                    print(f'[ERROR] [get_disk_info] Disk I/O statistics not available on this system {e}')
-                    pass
-                
-                disk_info.append({                
-                    "device": current_disk_info.get("device", "0"),
-                    "mountpoint": current_disk_info.get("mountpoint", "0"),
-                    "fstype": current_disk_info.get("fstype", "0"),
-                    "opts": current_disk_info.get("opts", "0"),
-                    "usage_total": current_disk_info.get("usage_total", "0"),
-                    "usage_used": current_disk_info.get("usage_used", "0"),
-                    "usage_free": current_disk_info.get("usage_free", "0"),
-                    "usage_percent": current_disk_info.get("usage_percent", "0"),
-                    "io_read_count": current_disk_info.get("io_read_count", "0"),
-                    "io_write_count": current_disk_info.get("io_write_count", "0")
-                })
+        io_rates = get_disk_io_rates()
+        for partition in get_disk_partitions():
+            current_disk_info = dict(partition)
+            try:
+                disk_usage = psutil.disk_usage(partition["mountpoint"])
+                current_disk_info['usage_total'] = f'{disk_usage.total / (1024**3):.2f} GB'
+                current_disk_info['usage_used'] = f'{disk_usage.used / (1024**3):.2f} GB'
+                current_disk_info['usage_free'] = f'{disk_usage.free / (1024**3):.2f} GB'
+                current_disk_info['usage_percent'] = f'{disk_usage.percent}%'
+                current_disk_info['used_bytes'] = disk_usage.used
+                current_disk_info['free_bytes'] = disk_usage.free
+                current_disk_info['percent'] = disk_usage.percent
+                current_disk_info['free_rate'], current_disk_info['eta_full'] = get_disk_free_rate(partition["mountpoint"], disk_usage.free)
+            except Exception as e:
+                print(f'[ERROR] [get_disk_info] Usage: [Permission denied] {e}')
+
+            device_io = io_rates.get(partition["io_key"], {})
+            disk_info.append({                
+                "device": current_disk_info.get("device", "0"),
+                "mountpoint": current_disk_info.get("mountpoint", "0"),
+                "fstype": current_disk_info.get("fstype", "0"),
+                "opts": current_disk_info.get("opts", "0"),
+                "usage_total": current_disk_info.get("usage_total", "0"),
+                "usage_used": current_disk_info.get("usage_used", "0"),
+                "usage_free": current_disk_info.get("usage_free", "0"),
+                "usage_percent": current_disk_info.get("usage_percent", "0"),
+                "io_read_count": str(device_io.get("read_count", "0")),
+                "io_write_count": str(device_io.get("write_count", "0")),
+                "used_bytes": current_disk_info.get("used_bytes", 0),
+                "free_bytes": current_disk_info.get("free_bytes", 0),
+                "percent": current_disk_info.get("percent", 0),
+                "read_bytes_rate": device_io.get("read_bytes_rate", 0.0),
+                "write_bytes_rate": device_io.get("write_bytes_rate", 0.0),
+                "read_iops": device_io.get("read_iops", 0.0),
+                "write_iops": device_io.get("write_iops", 0.0),
+                "free_rate": current_disk_info.get("free_rate", 0.0),
+                "eta_full": current_disk_info.get("eta_full")
+            })
 
         return disk_info
     except Exception as e:
         print(f'[{datetime.now().strftime("%Y-%m-%d %H:%M:%S")}] {e}')
         logging.info(f'[{datetime.now().strftime("%Y-%m-%d %H:%M:%S")}] [get_disk_info] [ERROR] e -> {e}')
-        return f'{e}'
+        return []
+
+# every write also publishes the rows that changed since the last publish of that source
+# on the telemetry channel. seq numbers let subscribers notice a gap and reload the full
+# snapshot from the keys above
+TELEMETRY_CHANNEL = "telemetry"
+TELEMETRY_SEQ_KEY = "telemetry:seq"
+telemetry_published = {}
+telemetry_seq = {}
+
+def telemetry_publish(pipe, source_name, rows, key_field):
+    previous = telemetry_published.get(source_name, {})
+    current = {}
+    changed = []
+    for row in rows:
+        row_key = str(row[key_field])
+        # timestamps change every sample, they alone don't make a row changed
+        current[row_key] = json.dumps({k: v for k, v in row.items() if k != "timestamp"}, sort_keys=True, default=str)
+        if previous.get(row_key) != current[row_key]:
+            changed.append(row)
+    removed = [row_key for row_key in previous if row_key not in current]
+    telemetry_published[source_name] = current
+    if not changed and not removed:
+        return
+    telemetry_seq[source_name] = telemetry_seq.get(source_name, 0) + 1
+    pipe.hset(TELEMETRY_SEQ_KEY, source_name, telemetry_seq[source_name])
+    pipe.publish(TELEMETRY_CHANNEL, json.dumps({
+        "source": source_name,
+        "seq": telemetry_seq[source_name],
+        "key_field": key_field,
+        "changed": changed,
+        "removed": removed
+    }, default=str))
+
+def write_disk_info(pipe, total_disk_info, ts):
+    updated_disk_data = []
+    for disk_i in range(0,len(total_disk_info)):
+        update_data = {
+            "disk_i": disk_i,
+            "disk_info": str(total_disk_info[disk_i]),
+            "timestamp": str(datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+        }
+        updated_disk_data.append(update_data)
+        history_add(pipe, "disk", total_disk_info[disk_i]["device"], total_disk_info[disk_i], ts)
+    pipe.set('db_disk', json.dumps(updated_disk_data))
+    telemetry_publish(pipe, "disk", [dict(current_disk_info, disk_i=disk_i, timestamp=updated_disk_data[disk_i]["timestamp"]) for disk_i, current_disk_info in enumerate(total_disk_info)], "mountpoint")
 
-total_disk_info = get_disk_info()
 
-async def redis_timer_disk():
-    while True:
+
+def get_gpu_static_info(gpu_i, handle):
+    current_gpu_info = {"gpu_i": gpu_i}
+
+    try:
+        current_gpu_info['current_uuid'] = f'{pynvml.nvmlDeviceGetUUID(handle)}'
+    except Exception as e:
+        print(f'0 gpu_info {e}')
+        current_gpu_info['current_uuid'] = f'0'
+
+    try:
+        current_gpu_info['name'] = f'{pynvml.nvmlDeviceGetName(handle)}'
+    except Exception as e:
+        print(f'00 gpu_info {e}')
+        current_gpu_info['name'] = f'0'
+
+    try:
+        current_gpu_info['cuda_cores'] = int(pynvml.nvmlDeviceGetNumGpuCores(handle))
+    except Exception as e:
+        print(f'8 gpu_info {e}')
+
+    res_compute_capability = 0.0
+    try:
+        compute_capability = pynvml.nvmlDeviceGetCudaComputeCapability(handle)
+        res_compute_capability = float(f'{compute_capability[0]}.{compute_capability[1]}')
+    except Exception as e:
+        print(f'9 gpu_info {e}')
+
+    if res_compute_capability == 0:
         try:
-            total_disk_info = get_disk_info()
-            res_db_disk = await r.get('db_disk')
-            if res_db_disk is not None:
-                db_disk = json.loads(res_db_disk)
-                updated_disk_data = []
-                for disk_i in range(0,len(total_disk_info)):
-                    update_data = {
-                        "disk_i": disk_i,
-                        "disk_info": str(total_disk_info[disk_i]),
-                        "timestamp": str(datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
-                    }
-                    updated_disk_data.append(update_data)
-                await r.set('db_disk', json.dumps(updated_disk_data))
+            res_name = current_gpu_info['name']
+            res_name_splitted_str = " ".join(res_name.split(" ")[1:])
+            if res_name.lower() in COMPUTE_CAPABILITIES:
+                print(f'-> res_name {res_name} exists with compute capability {COMPUTE_CAPABILITIES[res_name.lower()]}')
+                res_compute_capability = float(COMPUTE_CAPABILITIES[res_name.lower()])
+            elif res_name_splitted_str.lower() in COMPUTE_CAPABILITIES:
+                print(f'-> res_name_splitted_str {res_name_splitted_str} exists with compute capability {COMPUTE_CAPABILITIES[res_name_splitted_str.lower()]}')
+                res_compute_capability = float(COMPUTE_CAPABILITIES[res_name_splitted_str.lower()])
             else:
-                updated_disk_data = []
-                for disk_i in range(0,len(total_disk_info)):
-                    update_data = {
-                        "disk_i": disk_i,
-                        "disk_info": str(total_disk_info[disk_i]),
-                        "timestamp": str(datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
-                    }
-                    updated_disk_data.append(update_data)
-                await r.set('db_disk', json.dumps(updated_disk_data))
-            await asyncio.sleep(1.0)
+                print(f'{res_name.lower()} or {res_name_splitted_str.lower()} not found in database')
         except Exception as e:
-            print(f'[{datetime.now().strftime("%Y-%m-%d %H:%M:%S")}] Error: {e}')
-            await asyncio.sleep(1.0)
+            print(f'99 res_compute_capability e: {e}')
+
+    res_supported = []
+    res_not_supported = []
+    if res_compute_capability >= 8:
+        res_supported.append('Bfloat16')
+    else:
+        res_not_supported.append('Bfloat16')
+
+    current_gpu_info['compute_capability'] = res_compute_capability
+    current_gpu_info['supported'] = ",".join(res_supported)
+    current_gpu_info['not_supported'] = ",".join(res_not_supported)
+    return current_gpu_info
+
+
+# name, uuid, cores and compute capability never change while the backend runs,
+# so they are read once here instead of on every sampler tick
+device_static_info = [get_gpu_static_info(i, handle) for i, handle in enumerate(device_handles)]
 
+# NVML calls are blocking, all polling runs on this single worker thread
+gpu_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="nvml_sampler")
 
 
 def get_gpu_info():
+    # values are raw numbers in the units declared in METRICS_SCHEMA["gpu"]
     try:
-
-        device_count = pynvml.nvmlDeviceGetCount()
         gpu_info = []
-        for i in range(0,device_count):
-            current_gpu_info = {}
-            current_gpu_info['res_gpu_i'] = str(i)           
-            
-
-            
-            handle = pynvml.nvmlDeviceGetHandleByIndex(i)
-            
+        for i, handle in enumerate(device_handles):
+            current_gpu_info = dict(device_static_info[i])
 
-            
-            try:
-                res_uuid = pynvml.nvmlDeviceGetUUID(handle)
-                current_gpu_info['res_uuid'] = f'{res_uuid}'
-            except Exception as e:
-                print(f'0 gpu_info {e}')
-                current_gpu_info['res_uuid'] = f'0'
-            
-            
-            
-            try:
-                res_name = pynvml.nvmlDeviceGetName(handle)
-                current_gpu_info['res_name'] = f'{res_name}'
-            except Exception as e:
-                print(f'00 gpu_info {e}')
-                current_gpu_info['res_name'] = f'0'
-            
-            
-            
-        
-            
             try:
                 utilization = pynvml.nvmlDeviceGetUtilizationRates(handle)
-                # mem_util = f'{(mem_used / mem_total) * 100} %'
-                res_gpu_util = f'{utilization.gpu}%'
-                current_gpu_info['res_gpu_util'] = f'{res_gpu_util}'
-                
-                
-                # res_mem_util = f'{utilization.memory}%'
-                # current_gpu_info['res_mem_util'] = f'{res_mem_util}'
+                current_gpu_info['gpu_util'] = float(utilization.gpu)
             except Exception as e:
                 print(f'1 gpu_info {e}')
 
             try: 
                 mem_info = pynvml.nvmlDeviceGetMemoryInfo(handle)
-                res_mem_total = f'{mem_info.total / 1024 ** 2:.2f} MB'
-                current_gpu_info['res_mem_total'] = f'{res_mem_total}'
-                res_mem_used = f'{mem_info.used / 1024 ** 2:.2f} MB'
-                current_gpu_info['res_mem_used'] = f'{res_mem_used}'
-                res_mem_free = f'{mem_info.free / 1024 ** 2:.2f} MB'
-                current_gpu_info['res_mem_free'] = f'{res_mem_free}'
-                
-                res_mem_util = (float(mem_info.used / 1024**2)/float(mem_info.total / 1024**2)) * 100
-                current_gpu_info['res_mem_util'] = f'{"{:.2f}".format(res_mem_util)}% ({res_mem_used}/{res_mem_total})'
-
+                current_gpu_info['mem_total'] = int(mem_info.total)
+                current_gpu_info['mem_used'] = int(mem_info.used)
+                current_gpu_info['mem_free'] = int(mem_info.free)
+                current_gpu_info['mem_util'] = round((mem_info.used / mem_info.total) * 100, 2) if mem_info.total else 0.0
             except Exception as e:
                 print(f'2 gpu_info {e}')
             
             try:
-                # Get GPU temperature
-                temperature = pynvml.nvmlDeviceGetTemperature(handle, pynvml.NVML_TEMPERATURE_GPU)
-                res_temperature = f'{temperature}°C'
-                current_gpu_info['res_temperature'] = f'{res_temperature}'
+                current_gpu_info['temperature'] = int(pynvml.nvmlDeviceGetTemperature(handle, pynvml.NVML_TEMPERATURE_GPU))
             except Exception as e:
                 print(f'3 gpu_info {e}')
                 
             try:
-                # Get GPU fan speed
-                fan_speed = pynvml.nvmlDeviceGetFanSpeed(handle)
-                res_fan_speed = f'{fan_speed}%'
-                current_gpu_info['res_fan_speed'] = f'{res_fan_speed}'
+                current_gpu_info['fan_speed'] = int(pynvml.nvmlDeviceGetFanSpeed(handle))
             except Exception as e:
                 print(f'4 gpu_info {e}')
 
-
             try:
-                # Get GPU power usage
-                power_usage = pynvml.nvmlDeviceGetPowerUsage(handle)
-                res_power_usage = f'{power_usage / 1000:.2f} W'
-                current_gpu_info['res_power_usage'] = f'{res_power_usage}'
+                # nvml reports milliwatts
+                current_gpu_info['power_usage'] = round(pynvml.nvmlDeviceGetPowerUsage(handle) / 1000, 2)
             except Exception as e:
                 print(f'5 gpu_info {e}')
         
-        
             try:
-                # Get GPU clock speeds
-                clock_info_graphics = pynvml.nvmlDeviceGetClockInfo(handle, pynvml.NVML_CLOCK_GRAPHICS)
-                res_clock_info_graphics = f'{clock_info_graphics} MHz'
-                current_gpu_info['res_clock_info_graphics'] = f'{res_clock_info_graphics}'
+                current_gpu_info['clock_info_graphics'] = int(pynvml.nvmlDeviceGetClockInfo(handle, pynvml.NVML_CLOCK_GRAPHICS))
             except Exception as e:
                 print(f'6 gpu_info {e}')
             
-            
             try:
-                clock_info_mem = pynvml.nvmlDeviceGetClockInfo(handle, pynvml.NVML_CLOCK_MEM)
-                res_clock_info_mem = f'{clock_info_mem} MHz'
-                current_gpu_info['res_clock_info_mem'] = f'{res_clock_info_mem}'
+                current_gpu_info['clock_info_mem'] = int(pynvml.nvmlDeviceGetClockInfo(handle, pynvml.NVML_CLOCK_MEM))
             except Exception as e:
                 print(f'7 gpu_info {e}')
-                
-            try:
-                # Get GPU compute capability (compute_capability)
-                cuda_cores = pynvml.nvmlDeviceGetNumGpuCores(handle)
-                res_cuda_cores = f'{cuda_cores}'
-                current_gpu_info['res_cuda_cores'] = f'{res_cuda_cores}'
-            except Exception as e:
-                print(f'8 gpu_info {e}')
-
-            res_supported = []
-            res_not_supported = []
-            try:
-                # Get GPU compute capability (CUDA cores)
-                compute_capability = pynvml.nvmlDeviceGetCudaComputeCapability(handle)
-                compute_capability_str = f'{compute_capability[0]}.{compute_capability[1]}'
-                res_compute_capability = f'{compute_capability_str}'
 
-                if float(res_compute_capability) >= 8:
-                    res_supported.append('Bfloat16')
-                else:
-                    res_not_supported.append('Bfloat16')
-            except Exception as e:
-                print(f'9 gpu_info {e}')
-                res_compute_capability = 0
-
-            if res_compute_capability == 0:
-                try:
-                    res_name = pynvml.nvmlDeviceGetName(handle)
-                    res_name_split = res_name.split(" ")[1:]
-                    res_name_splitted_str = " ".join(res_name_split)
-                    if res_name.lower() in defaults_backend['compute_capability']:
-                        print(f'-> res_name {res_name} exists with compute capability {defaults_backend["compute_capability"][res_name.lower()]}')
-                        res_compute_capability = f'{defaults_backend["compute_capability"][res_name.lower()]}'
-                    elif res_name_splitted_str.lower() in defaults_backend['compute_capability']:
-                        print(f'-> res_name_splitted_str {res_name_splitted_str} exists with compute capability {defaults_backend["compute_capability"][res_name.lower()]}')
-                        res_compute_capability = f'{defaults_backend["compute_capability"][res_name_splitted_str.lower()]}'
-                    else:
-                        print(f'{res_name.lower()} or {res_name_splitted_str.lower()} not found in database')
-                except Exception as e:
-                    print(f'99 res_compute_capability e: {e}')
-
-            
-            
-            res_supported_str = ",".join(res_supported)
-            current_gpu_info['res_supported_str'] = f'{res_supported_str}'
-            res_not_supported_str = ",".join(res_not_supported)
-            current_gpu_info['res_not_supported_str'] = f'{res_not_supported_str}'
-            
-            gpu_info.append({                
-                "gpu_i": current_gpu_info.get("res_gpu_i", "0"),
-                "name": current_gpu_info.get("res_name", "0"),
-                "current_uuid": current_gpu_info.get("res_uuid", "0"),
-                "gpu_util": current_gpu_info.get("res_gpu_util", "0"),
-                "mem_util": current_gpu_info.get("res_mem_util", "0"),
-                "mem_total": current_gpu_info.get("res_mem_total", "0"),
-                "mem_used": current_gpu_info.get("res_mem_used", "0"),
-                "mem_free": current_gpu_info.get("res_mem_free", "0"),
-                "temperature": current_gpu_info.get("res_temperature", "0"),
-                "fan_speed": current_gpu_info.get("res_fan_speed", "0"),
-                "power_usage": current_gpu_info.get("res_power_usage", "0"),
-                "clock_info_graphics": current_gpu_info.get("res_clock_info_graphics", "0"),
-                "clock_info_mem": current_gpu_info.get("res_clock_info_mem", "0"),
-                "cuda_cores": current_gpu_info.get("res_cuda_cores", "0"),
-                "compute_capability": current_gpu_info.get("res_compute_capability", "0"),
-                "supported": current_gpu_info.get("res_supported", "0"),
-                "not_supported": current_gpu_info.get("res_not_supported", "0"),
-                "not_supported": current_gpu_info.get("res_not_supported", "0")
-            })
+            current_gpu_info['timestamp'] = time.time()
+            gpu_info.append(current_gpu_info)
                         
         return gpu_info
     except Exception as e:
         print(f'[{datetime.now().strftime("%Y-%m-%d %H:%M:%S")}] {e}')
-        return f'{e}'
+        logging.info(f'[{datetime.now().strftime("%Y-%m-%d %H:%M:%S")}] [get_gpu_info] [ERROR] e -> {e}')
+        return []
+
+
+def encode_metrics(schema_fields, data):
+    # flat str mapping for HSET, only fields declared in the schema are written
+    encoded = {}
+    for field_name, field_def in schema_fields.items():
+        if field_name not in data:
+            continue
+        if field_def["type"] == "int":
+            encoded[field_name] = str(int(data[field_name]))
+        elif field_def["type"] == "float":
+            encoded[field_name] = repr(float(data[field_name]))
+        else:
+            encoded[field_name] = str(data[field_name])
+    return encoded
 
 
+# history is kept as one redis stream per (tier, source, series), every stream is
+# capped with MAXLEN and expires once its tier retention passed without writes,
+# so memory stays bounded no matter how long the backend runs
+HISTORY_CONFIG = METRICS_SCHEMA["history"]
+history_buckets = {}
 
-total_gpu_info = get_gpu_info()
+def history_key(tier, source, series):
+    return f'history:{tier["name"]}:{source}:{series}'
 
-async def redis_timer_gpu():
-    while True:
-        try:
-            total_gpu_info = get_gpu_info()
-            res_db_gpu = await r.get('db_gpu')
-            if res_db_gpu is not None:
-                db_gpu = json.loads(res_db_gpu)
-                updated_gpu_data = []
-                for gpu_i in range(0,len(total_gpu_info)):
-                    update_data = {
-                        "gpu_i": gpu_i,
-                        "gpu_info": str(total_gpu_info[gpu_i]),
-                        "timestamp": str(datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
-                    }
-                    updated_gpu_data.append(update_data)
-                await r.set('db_gpu', json.dumps(updated_gpu_data))
-            else:
-                updated_gpu_data = []
-                for gpu_i in range(0,len(total_gpu_info)):
-                    update_data = {
-                        "gpu_i": gpu_i,
-                        "gpu_info": str(total_gpu_info[gpu_i]),
-                        "timestamp": str(datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
-                    }
-                    updated_gpu_data.append(update_data)
-                await r.set('db_gpu', json.dumps(updated_gpu_data))
-            await asyncio.sleep(1.0)
-        except Exception as e:
-            print(f'[{datetime.now().strftime("%Y-%m-%d %H:%M:%S")}] Error: {e}')
-            await asyncio.sleep(1.0)
+def history_write(pipe, key, tier, fields):
+    pipe.xadd(key, {k: repr(v) for k, v in fields.items()}, maxlen=tier["maxlen"], approximate=True)
+    pipe.expire(key, int(tier["step"] * tier["maxlen"]))
+
+def history_flush_bucket(bucket, kinds):
+    # gauges are averaged over the bucket, counters keep their last value
+    fields = {"ts": bucket["start"]}
+    for field_name, last_val in bucket["last"].items():
+        if kinds.get(field_name) == "counter":
+            fields[field_name] = last_val
+        else:
+            fields[field_name] = bucket["sum"][field_name] / bucket["n"]
+    return fields
+
+def history_add(pipe, source, series, sample, ts=None):
+    kinds = HISTORY_CONFIG["series"][source]
+    ts = ts or time.time()
+    values = {k: float(sample[k]) for k in kinds if isinstance(sample.get(k), (int, float))}
+    if not values:
+        return
+    for tier_i, tier in enumerate(HISTORY_CONFIG["tiers"]):
+        key = history_key(tier, source, series)
+        if tier_i == 0:
+            history_write(pipe, key, tier, {"ts": ts, **values})
+            continue
+        bucket_start = ts - (ts % tier["step"])
+        bucket = history_buckets.get(key)
+        if bucket is not None and bucket["start"] != bucket_start:
+            history_write(pipe, key, tier, history_flush_bucket(bucket, kinds))
+            bucket = None
+        if bucket is None:
+            bucket = {"start": bucket_start, "source": source, "tier": tier, "n": 0, "sum": {}, "last": {}}
+            history_buckets[key] = bucket
+        bucket["n"] = bucket["n"] + 1
+        for k, v in values.items():
+            bucket["sum"][k] = bucket["sum"].get(k, 0.0) + v
+            bucket["last"][k] = v
+
+def history_flush_stale(pipe, ts=None):
+    # series that stopped reporting (removed containers, unmounted disks) are flushed and dropped
+    ts = ts or time.time()
+    for key, bucket in list(history_buckets.items()):
+        if ts - bucket["start"] > 2 * bucket["tier"]["step"]:
+            history_write(pipe, key, bucket["tier"], history_flush_bucket(bucket, HISTORY_CONFIG["series"][bucket["source"]]))
+            del history_buckets[key]
+
+async def get_history(source, series, start, end, tier_name=None, count=None):
+    if not tier_name:
+        # smallest tier whose retention still covers the requested window
+        tier = HISTORY_CONFIG["tiers"][-1]
+        for current_tier in HISTORY_CONFIG["tiers"]:
+            if time.time() - start <= current_tier["step"] * current_tier["maxlen"]:
+                tier = current_tier
+                break
+    else:
+        tier = next(t for t in HISTORY_CONFIG["tiers"] if t["name"] == tier_name)
+    # downsampled entries are written at the end of their bucket, so widen the id range by one step
+    res_entries = await r.xrange(history_key(tier, source, series), min=int(start * 1000), max=int((end + tier["step"]) * 1000), count=count)
+    samples = []
+    for _entry_id, fields in res_entries:
+        sample = {k.decode(): float(v) for k, v in fields.items()}
+        if start <= sample["ts"] <= end:
+            samples.append(sample)
+    return {"tier": tier["name"], "step": tier["step"], "samples": samples}
+
+
+
+def write_gpu_info(pipe, total_gpu_info, ts):
+    for current_gpu_info in total_gpu_info:
+        pipe.hset(f'db_gpu:{current_gpu_info["gpu_i"]}', mapping=encode_metrics(METRICS_SCHEMA["gpu"], current_gpu_info))
+        history_add(pipe, "gpu", current_gpu_info["gpu_i"], current_gpu_info, current_gpu_info["timestamp"])
+    pipe.hset('db_gpu:meta', mapping={
+        "version": str(METRICS_SCHEMA["version"]),
+        "count": str(len(total_gpu_info)),
+        "timestamp": repr(ts)
+    })
+    telemetry_publish(pipe, "gpu", total_gpu_info, "gpu_i")
 
 
 
@@ -551,177 +932,847 @@ async def redis_timer_gpu():
 # aaaaa
 
 
-        
-def update_redis(**kwargs):
-    if not kwargs:
-        print(f'[update_redis] No data')
-        return False
-    if not 'db_name' in kwargs:
-        print(f'[update_redis]  no db_name')
-        return False
-    else:
-        print(f'kwargs["db_name"]: {kwargs["db_name"]}')
-    if not kwargs["db_name"]:
-        print(f'[update_redis] Error: Missing "db_name" in input data')
-        return False
-    
-    print(f'[update_redis] getting db ...')
-    res_db_list = r.lrange(kwargs["db_name"], 0, -1)
-    print(f'[update_redis] got db: {res_db_list}')
-    
-    print(f'HÄÄÄÄÄÄ 1')
-    if res_db_list:
-        print(f'HÄÄÄÄÄÄ 2')
-        print(f'found {len(res_db_list)} entries!')
-        
-        req_vllm_id_list = [entry for entry in res_db_list if json.loads(entry)["vllm_id"] == kwargs["vllm_id"]]
-        print(f'found req_vllm_id_list {req_vllm_id_list}!')
-        print(f'found req_vllm_id_list {len(req_vllm_id_list)}!')
-        
-        if len(req_vllm_id_list) > 0:
-            print(f'Found {kwargs["vllm_id"]}! Updating')
-            for entry in res_db_list:
-                parsed_entry = json.loads(entry)  # Convert JSON string to dictionary
-                print(f'*** parsed_entry {parsed_entry["vllm_id"]}!')
-                if parsed_entry["vllm_id"] == kwargs["vllm_id"]:
-                    print(f'found vllm_id {kwargs["vllm_id"]}!')
-                    r.lrem(kwargs["db_name"], 0, entry)
-                    print("entry deleted!")
-                    parsed_entry['ts'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                    print("trying push ...")
-                    r.rpush(kwargs["db_name"], json.dumps(parsed_entry))
-                    print("pushed!")
-                    return True
-        else:
-            print(f'didnt find {kwargs["vllm_id"]} yet! Creating')
-            update_data1 = {
-                "db_name": kwargs["db_name"],
-                "vllm_id": kwargs["vllm_id"],
-                "container": "b", 
-                "ts": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            }        
-            r.rpush(kwargs["db_name"], json.dumps(update_data1))
-            print("created!")
-            return True
-    else:
-        print(f'HÄÄÄÄÄÄ ELSEEEEEEE')
-        print("no entry found yet .. creating")
-        vllm_id = f'vllm_{str(int(datetime.now().timestamp()))}'
-        update_data1 = {
-            "db_name": kwargs["db_name"],
-            "vllm_id": kwargs["vllm_id"],
-            "container": "b", 
-            "ts": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        }        
-        r.rpush(kwargs["db_name"], json.dumps(update_data1))
-        print("created!")
-        return True
-    return True
-
 
+# all telemetry is collected by this one scheduler. every source has its own interval,
+# blocking collectors run off the event loop and everything a tick produced is written
+# to redis with a single pipeline
+COLLECTOR_CONFIG = defaults_backend["collector"]
+collector_sources = {
+    "gpu": {"collect": get_gpu_info, "write": write_gpu_info, "executor": gpu_executor},
+    "disk": {"collect": get_disk_info, "write": write_disk_info, "executor": None},
+    "network": {"collect": get_network_info, "write": write_network_info, "executor": None},
+    "inventory": {"collect": sync_inventory, "write": None, "executor": None}
+}
+collector_stats = {
+    "ticks": 0,
+    "skipped_ticks": 0,
+    "overruns": 0,
+    "tick_duration": 0.0,
+    "tick_duration_max": 0.0,
+    "sources": {name: {"runs": 0, "skipped_ticks": 0, "errors": 0, "duration": 0.0} for name in collector_sources}
+}
+collector_triggered = set()
+collector_wakeup = None
+collector_loop = None
+# last result of every source, served by /metrics without touching nvml, psutil or docker
+collector_latest = {}
+
+def collector_trigger(source_name):
+    # run a source on the next tick regardless of its interval, e.g. after a docker event
+    collector_triggered.add(source_name)
+    if collector_wakeup is not None:
+        collector_wakeup.set()
+
+def collector_trigger_threadsafe(source_name):
+    if collector_loop is not None:
+        collector_loop.call_soon_threadsafe(collector_trigger, source_name)
+
+def collector_jitter(interval):
+    return random.uniform(-1, 1) * COLLECTOR_CONFIG["jitter"] * interval
+
+async def collector_run_source(loop, source_name):
+    source = collector_sources[source_name]
+    start = time.monotonic()
+    try:
+        res_data = await loop.run_in_executor(source["executor"], source["collect"])
+        return source_name, res_data
+    except Exception as e:
+        collector_stats["sources"][source_name]["errors"] = collector_stats["sources"][source_name]["errors"] + 1
+        print(f'[{datetime.now().strftime("%Y-%m-%d %H:%M:%S")}] [collector] {source_name} Error: {e}')
+        logging.info(f'[{datetime.now().strftime("%Y-%m-%d %H:%M:%S")}] [collector] {source_name} {e}')
+        return source_name, None
+    finally:
+        collector_stats["sources"][source_name]["duration"] = time.monotonic() - start
+        collector_stats["sources"][source_name]["runs"] = collector_stats["sources"][source_name]["runs"] + 1
+
+def write_collector_stats(pipe):
+    db_collector = {k: v for k, v in collector_stats.items() if k != "sources"}
+    for source_name, source_stats in collector_stats["sources"].items():
+        for k, v in source_stats.items():
+            db_collector[f'{source_name}_{k}'] = v
+    pipe.hset('db_collector', mapping={k: str(v) for k, v in db_collector.items()})
+
+async def collector_scheduler():
+    global collector_wakeup, collector_loop
+    collector_wakeup = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    collector_loop = loop
+    now = time.monotonic()
+    next_due = {name: now for name in collector_sources}
+    while True:
+        try:
+            tick_start = time.monotonic()
+            due_sources = [name for name in collector_sources if next_due[name] <= tick_start or name in collector_triggered]
+            collector_triggered.difference_update(due_sources)
+            for source_name in due_sources:
+                interval = COLLECTOR_CONFIG["intervals"][source_name]
+                lag = tick_start - next_due[source_name]
+                if lag >= interval:
+                    # the previous tick ran so long that whole intervals of this source were missed
+                    missed = int(lag // interval)
+                    collector_stats["skipped_ticks"] = collector_stats["skipped_ticks"] + missed
+                    collector_stats["sources"][source_name]["skipped_ticks"] = collector_stats["sources"][source_name]["skipped_ticks"] + missed
+                next_due[source_name] = max(next_due[source_name] + interval, tick_start) + collector_jitter(interval)
+
+            res_collected = await asyncio.gather(*[collector_run_source(loop, name) for name in due_sources])
+            ts = time.time()
+            pipe = redis_pipeline()
+            for source_name, res_data in res_collected:
+                if res_data is not None:
+                    collector_latest[source_name] = res_data
+                if res_data is not None and collector_sources[source_name]["write"] is not None:
+                    collector_sources[source_name]["write"](pipe, res_data, ts)
+            history_flush_stale(pipe, ts)
+
+            tick_duration = time.monotonic() - tick_start
+            collector_stats["ticks"] = collector_stats["ticks"] + 1
+            collector_stats["tick_duration"] = tick_duration
+            collector_stats["tick_duration_max"] = max(collector_stats["tick_duration_max"], tick_duration)
+            if due_sources and tick_duration > min(COLLECTOR_CONFIG["intervals"][name] for name in due_sources):
+                collector_stats["overruns"] = collector_stats["overruns"] + 1
+                logging.info(f'[{datetime.now().strftime("%Y-%m-%d %H:%M:%S")}] [collector] overrun: tick took {tick_duration:.3f}s for {due_sources}')
+            write_collector_stats(pipe)
+            await pipe.execute()
+        except Exception as e:
+            print(f'[{datetime.now().strftime("%Y-%m-%d %H:%M:%S")}] [collector] Error: {e}')
+            logging.info(f'[{datetime.now().strftime("%Y-%m-%d %H:%M:%S")}] [collector] {e}')
 
+        collector_wakeup.clear()
+        sleep_for = 0 if collector_triggered else max(min(next_due.values()) - time.monotonic(), 0)
+        try:
+            await asyncio.wait_for(collector_wakeup.wait(), timeout=sleep_for)
+        except asyncio.TimeoutError:
+            pass
+
+
+VLLM_PROXY_CONFIG = defaults_backend['vllm_proxy']
+
+# one keep-alive client and concurrency limit per vLLM container, created on first use
+vllm_clients = {}
+
+def get_vllm_client(vllmcontainer, port):
+    base_url = f'http://{vllmcontainer}:{port}'
+    if base_url not in vllm_clients:
+        vllm_clients[base_url] = {
+            "client": httpx.AsyncClient(
+                base_url=base_url,
+                timeout=httpx.Timeout(
+                    connect=float(VLLM_PROXY_CONFIG["connect_timeout"]),
+                    read=float(VLLM_PROXY_CONFIG["read_timeout"]),
+                    write=float(VLLM_PROXY_CONFIG["write_timeout"]),
+                    pool=float(VLLM_PROXY_CONFIG["pool_timeout"])
+                ),
+                limits=httpx.Limits(
+                    max_connections=int(VLLM_PROXY_CONFIG["max_connections"]),
+                    max_keepalive_connections=int(VLLM_PROXY_CONFIG["max_keepalive_connections"]),
+                    keepalive_expiry=float(VLLM_PROXY_CONFIG["keepalive_expiry"])
+                )
+            ),
+            "semaphore": asyncio.Semaphore(int(VLLM_PROXY_CONFIG["max_concurrency"]))
+        }
+    return vllm_clients[base_url]
+
+async def vllm_post(vllmcontainer, port, path, payload):
+    vllm_activity[vllmcontainer] = time.time()
+    vllm_client = get_vllm_client(vllmcontainer, port)
+    async with vllm_tracked(vllmcontainer), vllm_client["semaphore"]:
+        return await vllm_client["client"].post(path, json=payload)
 
-def get_vllm_info():
-    try:        
+@asynccontextmanager
+async def vllm_tracked(vllmcontainer):
+    # outstanding requests per container, read by the replica router
+    vllm_outstanding[vllmcontainer] = vllm_outstanding.get(vllmcontainer, 0) + 1
+    try:
+        yield
+    finally:
+        vllm_outstanding[vllmcontainer] -= 1
+
+def vllm_api(req_data):
+    # "oai" speaks /v1/chat/completions, "xoo" the custom /vllm api; routed requests carry it from the registry
+    if req_data.get("api"):
+        return req_data["api"]
+    return {"container_vllm_oai": "oai", "container_vllm_xoo": "xoo"}.get(req_data["vllmcontainer"])
+
+INFERENCE_METRICS_CONFIG = defaults_backend['inference_metrics']
+INFERENCE_METRICS = ["ttft", "latency", "queue_time", "tokens_per_sec", "prompt_tokens", "completion_tokens"]
+INFERENCE_METRICS_CONTAINERS_KEY = "metrics:inference:containers"
+
+def inference_metrics_key(vllmcontainer, metric):
+    return f'metrics:inference:{vllmcontainer}:{metric}'
+
+def inference_sample(prompt, text, usage, ttft, latency, queue_time):
+    # token counts from the usage block, otherwise ~4 characters per token
+    prompt_tokens = (usage or {}).get("prompt_tokens") or len(str(prompt)) // 4
+    completion_tokens = (usage or {}).get("completion_tokens") or len(str(text)) // 4
+    generation_time = latency - queue_time
+    return {
+        "ttft": ttft,
+        "latency": latency,
+        "queue_time": queue_time,
+        "tokens_per_sec": completion_tokens / generation_time if generation_time > 0 else 0.0,
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens
+    }
+
+def histogram_bucket(value):
+    # log buckets, each one bucket_base times wider than the one before (hdr style relative precision)
+    if value <= 0:
+        return "zero"
+    return f'b{math.floor(math.log(value, float(INFERENCE_METRICS_CONFIG["bucket_base"])))}'
+
+def histogram_value(bucket):
+    if bucket == "zero":
+        return 0.0
+    return float(INFERENCE_METRICS_CONFIG["bucket_base"]) ** (int(bucket[1:]) + 0.5)
+
+# in memory mirror of the redis histograms since this backend started, for /metrics
+inference_histograms = {}
+
+async def inference_metrics_record(vllmcontainer, sample):
+    for metric, value in sample.items():
+        hist = inference_histograms.setdefault((vllmcontainer, metric), {"buckets": {}, "count": 0, "sum": 0.0})
+        bucket = histogram_bucket(value)
+        hist["buckets"][bucket] = hist["buckets"].get(bucket, 0) + 1
+        hist["count"] += 1
+        hist["sum"] += value
+    pipe = redis_pipeline()
+    pipe.sadd(INFERENCE_METRICS_CONTAINERS_KEY, vllmcontainer)
+    for container_name in (vllmcontainer, "all"):
+        for metric, value in sample.items():
+            key = inference_metrics_key(container_name, metric)
+            pipe.hincrby(key, histogram_bucket(value), 1)
+            pipe.hincrby(key, "count", 1)
+            pipe.hincrbyfloat(key, "sum", value)
+            pipe.expire(key, int(INFERENCE_METRICS_CONFIG["ttl"]))
+    await pipe.execute()
+
+def histogram_summary(res_hist, percentiles):
+    count = int(res_hist.pop("count", 0))
+    total = float(res_hist.pop("sum", 0.0))
+    buckets = sorted(((histogram_value(bucket), int(n)) for bucket, n in res_hist.items()))
+    res_summary = {"count": count, "mean": total / count if count else 0.0}
+    for percentile in percentiles:
+        rank = percentile / 100 * count
+        seen = 0
+        res_summary[f'p{percentile:g}'] = 0.0
+        for value, n in buckets:
+            seen += n
+            if seen >= rank:
+                res_summary[f'p{percentile:g}'] = value
+                break
+    res_summary["max"] = buckets[-1][0] if buckets else 0.0
+    return res_summary
+
+async def get_inference_metrics(vllmcontainer=None):
+    if vllmcontainer:
+        container_names = [vllmcontainer]
+    else:
+        container_names = ["all"] + sorted(c.decode() for c in await r.smembers(INFERENCE_METRICS_CONTAINERS_KEY))
+    res_hists = await redis_hgetall_many([inference_metrics_key(container_name, metric) for container_name in container_names for metric in INFERENCE_METRICS])
+    res_metrics = {}
+    for i, container_name in enumerate(container_names):
+        res_metrics[container_name] = {}
+        for j, metric in enumerate(INFERENCE_METRICS):
+            res_hist = {k.decode(): v.decode() for k, v in res_hists[i * len(INFERENCE_METRICS) + j].items()}
+            res_metrics[container_name][metric] = histogram_summary(res_hist, INFERENCE_METRICS_CONFIG["percentiles"])
+    return res_metrics
+
+class AdmissionRejected(Exception):
+    def __init__(self, vllmcontainer, retry_after):
+        super().__init__(f'{vllmcontainer} is overloaded, retry after {retry_after}s')
+        self.retry_after = retry_after
+
+
+class AdmissionQueue:
+    """KV-cache token budget for one vLLM container with a priority wait queue.
+
+    A request costs its estimated prompt tokens plus max_tokens. Requests are admitted
+    while they fit in the budget (an idle container always admits one), the rest wait
+    ordered by priority then arrival, and a full queue rejects at once with a retry-after.
+    """
+
+    def __init__(self, vllmcontainer, token_capacity, max_queue, queue_timeout, capacity_fields=None):
+        self.vllmcontainer = vllmcontainer
+        self.token_capacity = token_capacity
+        # the registry values token_capacity was derived from
+        self.capacity_fields = capacity_fields
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.tokens_in_use = 0
+        self.in_flight = 0
+        self.waiters = []
+        self.seq = 0
+        self.stats = {"admitted": 0, "rejected": 0, "timeouts": 0, "queue_time_ewma": 0.0, "queue_time_max": 0.0, "service_time_ewma": 0.0}
+
+    def can_admit(self, cost):
+        return self.in_flight == 0 or self.tokens_in_use + cost <= self.token_capacity
+
+    def grant(self, cost, queue_time):
+        self.tokens_in_use += cost
+        self.in_flight += 1
+        self.stats["admitted"] += 1
+        alpha = float(ADMISSION_CONFIG["ewma_alpha"])
+        self.stats["queue_time_ewma"] += alpha * (queue_time - self.stats["queue_time_ewma"])
+        self.stats["queue_time_max"] = max(self.stats["queue_time_max"], queue_time)
+
+    def retry_after(self):
+        # time for the queue ahead to drain at the current concurrency
+        est = self.stats["service_time_ewma"] * (len(self.waiters) + 1) / max(self.in_flight, 1)
+        return max(1, math.ceil(est))
+
+    def reject(self):
+        self.stats["rejected"] += 1
+        raise AdmissionRejected(self.vllmcontainer, self.retry_after())
+
+    async def acquire(self, cost, priority):
+        cost = min(cost, self.token_capacity)
+        if not self.waiters and self.can_admit(cost):
+            self.grant(cost, 0.0)
+            return cost
+        if len(self.waiters) >= self.max_queue:
+            self.reject()
+        start = time.monotonic()
+        future = asyncio.get_running_loop().create_future()
+        self.seq += 1
+        waiter = (priority, self.seq, cost, start, future)
+        heapq.heappush(self.waiters, waiter)
+        try:
+            await asyncio.wait_for(future, timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.discard(waiter)
+            self.stats["timeouts"] += 1
+            self.reject()
+        except asyncio.CancelledError:
+            # granted right before the caller went away, hand the slot on
+            if future.done() and not future.cancelled():
+                self.release(cost, 0.0)
+            else:
+                self.discard(waiter)
+            raise
+        return cost
+
+    def discard(self, waiter):
+        # a waiter that gave up no longer counts against max_queue
+        if waiter in self.waiters:
+            self.waiters.remove(waiter)
+            heapq.heapify(self.waiters)
+            # it may have been the head holding back smaller requests that fit now
+            self.dispatch()
+
+    def release(self, cost, service_time):
+        self.tokens_in_use -= cost
+        self.in_flight -= 1
+        alpha = float(ADMISSION_CONFIG["ewma_alpha"])
+        self.stats["service_time_ewma"] += alpha * (service_time - self.stats["service_time_ewma"])
+        self.dispatch()
+
+    def dispatch(self):
+        now = time.monotonic()
+        while self.waiters:
+            priority, seq, cost, start, future = self.waiters[0]
+            if future.done():
+                heapq.heappop(self.waiters)
+                continue
+            if not self.can_admit(cost):
+                break
+            heapq.heappop(self.waiters)
+            self.grant(cost, now - start)
+            future.set_result(True)
+
+    def snapshot(self):
+        return {
+            "vllmcontainer": self.vllmcontainer,
+            "token_capacity": self.token_capacity,
+            "tokens_in_use": self.tokens_in_use,
+            "in_flight": self.in_flight,
+            "queued": sum(1 for waiter in self.waiters if not waiter[-1].done()),
+            "max_queue": self.max_queue,
+            **self.stats
+        }
+
+
+ADMISSION_CONFIG = defaults_backend['admission']
+admission_queues = {}
+
+ADMISSION_CAPACITY_FIELDS = ["gpu_uuids", "gpu_memory_utilization", "max_model_len"]
+
+def admission_capacity_fields(vllm_entry):
+    return json.dumps({field: (vllm_entry or {}).get(field) for field in ADMISSION_CAPACITY_FIELDS}, sort_keys=True)
+
+def admission_capacity(vllm_entry):
+    token_capacity = int(ADMISSION_CONFIG["default_token_capacity"])
+    if vllm_entry and vllm_entry.get("gpu_uuids"):
+        # kv cache is what vllm keeps of its gpu_memory_utilization share after the weights
+        kv_bytes = sum(device_mem_totals.get(gpu_uuid, 0) for gpu_uuid in vllm_entry["gpu_uuids"]) * float(vllm_entry["gpu_memory_utilization"]) * float(ADMISSION_CONFIG["kv_fraction"])
+        token_capacity = max(int(kv_bytes / int(ADMISSION_CONFIG["kv_bytes_per_token"])), int(vllm_entry.get("max_model_len", 0)))
+    return token_capacity
+
+def admission_invalidate(vllmcontainer):
+    # the container is gone, a new one under the same name starts with a fresh queue
+    admission_queues.pop(vllmcontainer, None)
+
+async def admission_refresh(vllmcontainer):
+    # registry writes that leave the capacity inputs alone (status, mem stats) keep the queue as it is
+    admission_queue = admission_queues.get(vllmcontainer)
+    if admission_queue is None:
+        return
+    vllm_entry = await registry_get(vllmcontainer)
+    capacity_fields = admission_capacity_fields(vllm_entry)
+    if capacity_fields == admission_queue.capacity_fields:
+        return
+    # resized in place, so in_flight and tokens_in_use of the admitted requests carry over
+    admission_queue.token_capacity = admission_capacity(vllm_entry)
+    admission_queue.capacity_fields = capacity_fields
+    admission_queue.dispatch()
+
+async def get_admission_queue(vllmcontainer):
+    if vllmcontainer not in admission_queues:
+        vllm_entry = await registry_get(vllmcontainer)
+        # another first request may have built it while this one waited on redis
+        if vllmcontainer not in admission_queues:
+            admission_queues[vllmcontainer] = AdmissionQueue(vllmcontainer, admission_capacity(vllm_entry), int(ADMISSION_CONFIG["max_queue"]), float(ADMISSION_CONFIG["queue_timeout"]), admission_capacity_fields(vllm_entry))
+    return admission_queues[vllmcontainer]
 
-        # print(f' @@@ [get_vllm_info] testing redis ...!')
-        print(f' @@@ [get_vllm_info] VOR ERROR??????????????????????????????????????????????????')
-        update_data3 = {"db_name": "db_vllm", "vllm_id": "10", "container": "b", "ts": f'{datetime.now().strftime("%Y-%m-%d %H:%M:%S")}'}
-        res_update_redis = update_redis(**update_data3)
-        print(f' @@@ [get_vllm_info] res_update_redis: {res_update_redis} ...!')
-        
-        
-        # redis_data = {"db_name": "db_vllm", "vllm_id": "10", "model": "blabla", "ts": "123"}
-        # print(f' @@@ [get_vllm_info] trying to save redis ...')
-        # save_redis(**redis_data)
-        # print(f' @@@ [get_vllm_info] saved redis!')
+@asynccontextmanager
+async def vllm_admitted(req_data, prompt):
+    admission_queue = await get_admission_queue(req_data["vllmcontainer"])
+    # ~4 characters per token for the prompt estimate
+    cost = len(str(prompt)) // 4 + int(req_data.get("max_tokens", 150))
+    priority = ADMISSION_CONFIG["priorities"].get(req_data.get("priority", "interactive"), 0)
+    queue_start = time.monotonic()
+    cost = await admission_queue.acquire(cost, priority)
+    start = time.monotonic()
+    try:
+        yield {"queue_time": start - queue_start}
+    finally:
+        admission_queue.release(cost, time.monotonic() - start)
 
-        return f'{update_data3} saved!'
+async def vllm_generate_one(req_data, prompt):
+    start = time.monotonic()
+    try:
+        if not await vllm_ensure_running(req_data["vllmcontainer"]):
+            return {"result_status": 503, "result_data": f'{req_data["vllmcontainer"]} could not be restarted', "latency": time.monotonic() - start}
+        # a restart of an idle container is reported apart, it would skew latency and token rates
+        cold_start = time.monotonic() - start
+        start = time.monotonic()
+        async with vllm_admitted(req_data, prompt) as admission:
+            res_data = await vllm_generate_request(req_data, prompt)
+        res_data["latency"] = time.monotonic() - start
+        res_data["cold_start"] = cold_start
+        res_data["queue_time"] = admission["queue_time"]
+        if res_data["result_status"] == 200:
+            # without streaming the first token arrives with the whole answer
+            await inference_metrics_record(req_data["vllmcontainer"], inference_sample(prompt, res_data["result_data"], res_data, res_data["latency"], res_data["latency"], admission["queue_time"]))
+        return res_data
+    except AdmissionRejected as e:
+        return {"result_status": 429, "result_data": f'{e}', "retry_after": e.retry_after, "latency": time.monotonic() - start}
     except Exception as e:
-        print(f'[{datetime.now().strftime("%Y-%m-%d %H:%M:%S")}] [get_vllm_info] {e}')
-        logging.info(f'[{datetime.now().strftime("%Y-%m-%d %H:%M:%S")}] [get_vllm_info] [ERROR] e -> {e}')
-        return f'{e}'
+        return {"result_status": 500, "result_data": f'{e}', "latency": time.monotonic() - start}
+
+async def vllm_generate_request(req_data, prompt):
+    start = time.monotonic()
+    try:
+        if vllm_api(req_data) == "oai":
+            response = await vllm_post(req_data["vllmcontainer"], req_data["port"], "/v1/chat/completions", {
+                "model":req_data["model"],
+                "messages": [
+                                {
+                                    "role": "user",
+                                    "content": f'{prompt}'
+                                }
+                ],
+                "temperature":float(req_data.get("temperature", 0.8)),
+                "top_p":float(req_data.get("top_p", 0.95)),
+                "max_tokens":int(req_data.get("max_tokens", 150))
+            })
+            if response.status_code != 200:
+                return {"result_status": response.status_code, "result_data": f'response.status_code {response.status_code}', "latency": time.monotonic() - start}
+            response_json = response.json()
+            usage = response_json.get("usage", {})
+            return {
+                "result_status": 200,
+                "result_data": response_json["choices"][0]["message"]["content"],
+                "latency": time.monotonic() - start,
+                "prompt_tokens": usage.get("prompt_tokens"),
+                "completion_tokens": usage.get("completion_tokens")
+            }
 
+        if vllm_api(req_data) == "xoo":
+            response = await vllm_post(req_data["vllmcontainer"], req_data["port"], "/vllm", {
+                "req_type":"generate",
+                "prompt":prompt,
+                "temperature":float(req_data.get("temperature", 0.8)),
+                "top_p":float(req_data.get("top_p", 0.95)),
+                "max_tokens":int(req_data.get("max_tokens", 150))
+            })
+            if response.status_code != 200:
+                return {"result_status": response.status_code, "result_data": f'response.status_code {response.status_code}', "latency": time.monotonic() - start}
+            response_json = response.json()
+            usage = response_json.get("usage", {})
+            return {
+                "result_status": 200,
+                "result_data": f'{response_json["result_data"]}',
+                "latency": time.monotonic() - start,
+                "prompt_tokens": usage.get("prompt_tokens"),
+                "completion_tokens": usage.get("completion_tokens")
+            }
 
-total_vllm_info = get_vllm_info()
+        return {"result_status": 404, "result_data": f'{req_data["vllmcontainer"]} not found!', "latency": time.monotonic() - start}
+    except Exception as e:
+        # connection errors and timeouts, as opposed to errors the server answered with
+        return {"result_status": 500, "result_data": f'{e}', "latency": time.monotonic() - start, "transport_error": isinstance(e, httpx.TransportError)}
+
+GENERATE_CACHE_CONFIG = defaults_backend['generate_cache']
+GENERATE_CACHE_LRU_KEY = "cache:gen:lru"
+GENERATE_CACHE_STATS_KEY = "cache:gen:stats"
+
+def generate_cache_key(req_data, prompt):
+    cache_fields = {
+        # routed requests may leave it out, the model then picks the entry
+        "vllmcontainer": req_data.get("vllmcontainer"),
+        "model": req_data.get("model"),
+        "prompt": prompt,
+        "temperature": float(req_data.get("temperature", 0.8)),
+        "top_p": float(req_data.get("top_p", 0.95)),
+        "max_tokens": int(req_data.get("max_tokens", 150))
+    }
+    return f'cache:gen:{hashlib.sha256(json.dumps(cache_fields, sort_keys=True).encode()).hexdigest()}'
+
+def generate_cacheable(req_data):
+    # opt-in per request ("cache": true) or globally, and by default only for temperature 0
+    if not req_data.get("cache", GENERATE_CACHE_CONFIG["enabled"]):
+        return False
+    if GENERATE_CACHE_CONFIG["deterministic_only"] and float(req_data.get("temperature", 0.8)) != 0.0:
+        return False
+    return True
 
-async def redis_timer_vllm2():
+async def generate_cache_get(cache_key):
+    res_cached = await redis_get_json(cache_key)
+    pipe = redis_pipeline()
+    if res_cached is None:
+        pipe.hincrby(GENERATE_CACHE_STATS_KEY, "misses", 1)
+        # the entry expired, its lru member would otherwise linger until it is the oldest
+        pipe.zrem(GENERATE_CACHE_LRU_KEY, cache_key)
+    else:
+        pipe.hincrby(GENERATE_CACHE_STATS_KEY, "hits", 1)
+        pipe.zadd(GENERATE_CACHE_LRU_KEY, {cache_key: time.time()})
+    await pipe.execute()
+    return res_cached
+
+async def generate_cache_set(cache_key, res_data):
+    pipe = redis_pipeline()
+    pipe.set(cache_key, json.dumps(res_data), ex=int(GENERATE_CACHE_CONFIG["ttl"]))
+    pipe.zadd(GENERATE_CACHE_LRU_KEY, {cache_key: time.time()})
+    # members not used within the ttl belong to expired entries, drop them before counting
+    pipe.zremrangebyscore(GENERATE_CACHE_LRU_KEY, "-inf", time.time() - int(GENERATE_CACHE_CONFIG["ttl"]))
+    pipe.zcard(GENERATE_CACHE_LRU_KEY)
+    res_pipe = await pipe.execute()
+    overflow = res_pipe[-1] - int(GENERATE_CACHE_CONFIG["max_entries"])
+    if overflow > 0:
+        evicted = [key for key, _ in await r.zpopmin(GENERATE_CACHE_LRU_KEY, overflow)]
+        pipe = redis_pipeline()
+        pipe.delete(*evicted)
+        pipe.hincrby(GENERATE_CACHE_STATS_KEY, "evictions", len(evicted))
+        await pipe.execute()
+
+async def get_generate_cache_stats():
+    res_stats = await r.hgetall(GENERATE_CACHE_STATS_KEY)
+    res_stats = {k.decode(): int(v) for k, v in res_stats.items()}
+    pipe = redis_pipeline()
+    pipe.zremrangebyscore(GENERATE_CACHE_LRU_KEY, "-inf", time.time() - int(GENERATE_CACHE_CONFIG["ttl"]))
+    pipe.zcard(GENERATE_CACHE_LRU_KEY)
+    res_stats["entries"] = (await pipe.execute())[-1]
+    lookups = res_stats.get("hits", 0) + res_stats.get("misses", 0)
+    res_stats["hit_rate"] = res_stats.get("hits", 0) / lookups if lookups else 0.0
+    return res_stats
+
+ROUTING_CONFIG = defaults_backend['routing']
+ROUTING_STATUSES = ["created", "running"]
+
+# requests in flight per container, and containers taken out of rotation until a monotonic time
+vllm_outstanding = {}
+vllm_unhealthy_until = {}
+# consecutive server errors per container, a single one doesn't take it out of rotation
+vllm_failures = {}
+# overloaded replicas, worth one more try elsewhere but no sign of an unhealthy one
+ROUTING_RETRY_STATUSES = [429, 503]
+
+def vllm_routed(req_data):
+    return req_data.get("vllmcontainer") in (None, "", "auto")
+
+def replica_weight(vllm_entry):
+    gpu_names = {g.get("current_uuid"): str(g.get("name", "")).lower() for g in device_static_info}
+    gpu_weights = []
+    for gpu_uuid in (vllm_entry.get("gpu_uuids") or []):
+        gpu_name = gpu_names.get(gpu_uuid, "")
+        gpu_weights.append(next((float(w) for k, w in ROUTING_CONFIG["gpu_weights"].items() if k in gpu_name), 1.0))
+    return sum(gpu_weights) / len(gpu_weights) if gpu_weights else 1.0
+
+async def get_replicas(model):
+    # every registered replica of a model with its routing state, best candidate first
+    now = time.monotonic()
+    containers = {inventory_name(c): c for c in get_container_list(all=True)}
+    replicas = []
+    for vllm_entry in await registry_find(model=model):
+        container_attrs = containers.get(vllm_entry["vllm_id"])
+        if container_attrs is None:
+            continue
+        container_state = container_attrs.get("State", {})
+        outstanding = vllm_outstanding.get(vllm_entry["vllm_id"], 0)
+        weight = replica_weight(vllm_entry)
+        replicas.append({
+            "vllmcontainer": vllm_entry["vllm_id"],
+            "port": vllm_entry["port"],
+            "api": "xoo" if "xoo4foo/" in str(vllm_entry.get("image", "")) else "oai",
+            "status": vllm_entry.get("status"),
+            "healthy": container_state.get("Status") == "running" and container_state.get("Health", {}).get("Status") != "unhealthy" and vllm_unhealthy_until.get(vllm_entry["vllm_id"], 0) <= now and vllm_entry.get("status") in ROUTING_STATUSES,
+            "outstanding": outstanding,
+            "weight": weight,
+            "score": (outstanding + 1) / weight,
+            "tiebreak": random.random()
+        })
+    # healthy replicas by least weighted outstanding requests, idle stopped ones last so they get restarted only if needed
+    replicas = [replica for replica in replicas if replica["healthy"] or replica["status"] == "idle_stopped"]
+    replicas.sort(key=lambda replica: (not replica["healthy"], replica["score"], replica["tiebreak"]))
+    return replicas
+
+def replica_req_data(req_data, replica):
+    return dict(req_data, vllmcontainer=replica["vllmcontainer"], port=replica["port"], api=replica["api"])
+
+async def vllm_generate_routed(req_data, prompt):
+    if not vllm_routed(req_data):
+        return await vllm_generate_one(req_data, prompt)
+    replicas = await get_replicas(req_data["model"])
+    if not replicas:
+        return {"result_status": 404, "result_data": f'no replica of {req_data["model"]} available', "latency": 0.0}
+    res_data = None
+    overload_retried = False
+    for replica in replicas[:int(ROUTING_CONFIG["max_attempts"])]:
+        res_data = await vllm_generate_one(replica_req_data(req_data, replica), prompt)
+        res_data["vllmcontainer"] = replica["vllmcontainer"]
+        if res_data["result_status"] in ROUTING_RETRY_STATUSES:
+            if overload_retried:
+                return res_data
+            overload_retried = True
+            print(f'[{datetime.now().strftime("%Y-%m-%d %H:%M:%S")}] [vllm_generate_routed] {replica["vllmcontainer"]} overloaded ({res_data["result_status"]}), trying next replica')
+            continue
+        if res_data["result_status"] < 500:
+            vllm_failures.pop(replica["vllmcontainer"], None)
+            return res_data
+        vllm_failures[replica["vllmcontainer"]] = vllm_failures.get(replica["vllmcontainer"], 0) + 1
+        print(f'[{datetime.now().strftime("%Y-%m-%d %H:%M:%S")}] [vllm_generate_routed] {replica["vllmcontainer"]} failed ({res_data["result_data"]}), trying next replica')
+        if res_data.get("transport_error") or vllm_failures[replica["vllmcontainer"]] >= int(ROUTING_CONFIG["failure_threshold"]):
+            vllm_unhealthy_until[replica["vllmcontainer"]] = time.monotonic() + float(ROUTING_CONFIG["unhealthy_cooldown"])
+            vllm_failures.pop(replica["vllmcontainer"], None)
+    return res_data
+
+async def vllm_generate_cached(req_data, prompt):
+    if not generate_cacheable(req_data):
+        return await vllm_generate_routed(req_data, prompt)
+    start = time.monotonic()
+    cache_key = generate_cache_key(req_data, prompt)
+    res_cached = await generate_cache_get(cache_key)
+    if res_cached is not None:
+        # timings of the call that filled the entry don't describe this one
+        res_cached.update(cached=True, latency=time.monotonic() - start, queue_time=0.0, cold_start=0.0)
+        return res_cached
+    res_data = await vllm_generate_routed(req_data, prompt)
+    if res_data["result_status"] == 200:
+        await generate_cache_set(cache_key, res_data)
+    return res_data
+
+async def vllm_generate_batch(req_data):
+    # results keep the order of req_data["prompts"], at most batch_concurrency in flight
+    batch_concurrency = int(VLLM_PROXY_CONFIG["batch_concurrency"])
+    batch_semaphore = asyncio.Semaphore(max(1, min(int(req_data.get("concurrency", batch_concurrency)), batch_concurrency)))
+    req_data = dict(req_data, priority=req_data.get("priority", "batch"))
+    async def run_one(prompt):
+        async with batch_semaphore:
+            return await vllm_generate_cached(req_data, prompt)
+    return await asyncio.gather(*(run_one(prompt) for prompt in req_data["prompts"]))
+
+READINESS_CONFIG = defaults_backend['readiness']
+
+def readiness_key(vllmcontainer):
+    return f'readiness:{vllmcontainer}'
+
+async def readiness_report(vllmcontainer, state, attempt, started, detail=""):
+    pipe = redis_pipeline()
+    pipe.hset(readiness_key(vllmcontainer), mapping={
+        "state": state,
+        "attempt": attempt,
+        "elapsed": round(time.monotonic() - started, 2),
+        "detail": detail,
+        "timestamp": time.time()
+    })
+    pipe.expire(readiness_key(vllmcontainer), int(READINESS_CONFIG["progress_ttl"]))
+    await pipe.execute()
+
+async def get_readiness(vllmcontainer):
+    res_readiness = await r.hgetall(readiness_key(vllmcontainer))
+    return {k.decode(): v.decode() for k, v in res_readiness.items()}
+
+def get_container_state(vllmcontainer):
+    # the inventory follows start/die/health_status events, inspect only if the container is not in it yet
+    container_attrs = next((c for c in get_container_list(all=True) if inventory_name(c) == vllmcontainer), None)
+    if container_attrs is None:
+        container_attrs = client.api.inspect_container(vllmcontainer)
+    container_state = container_attrs.get("State", {})
+    return container_state.get("Status"), container_state.get("Health", {}).get("Status")
+
+async def wait_vllm_ready(vllmcontainer, port, timeout=None):
+    # polls the http health endpoint with backoff until the server answers, the container dies or timeout
+    timeout = float(timeout or READINESS_CONFIG["timeout"])
+    delay = float(READINESS_CONFIG["initial_delay"])
+    started = time.monotonic()
+    attempt = 0
+    vllm_client = get_vllm_client(vllmcontainer, port)
     while True:
+        attempt += 1
+        status, health = await asyncio.to_thread(get_container_state, vllmcontainer)
+        if status in ("exited", "dead") or health == "unhealthy":
+            await readiness_report(vllmcontainer, "failed", attempt, started, f'container {status} health {health}')
+            return False
         try:
-            current_network_info = get_network_info()
-            res_db_network = await r.get('db_vllm2')
-            if res_db_network is not None:
-                db_network = json.loads(res_db_network)
-                updated_network_data = []
-                for net_info_obj in current_network_info:
-                    update_data = {
-                        "container": str(net_info_obj["container"]),
-                        "info": str(net_info_obj["info"]),
-                        "current_dl": str(net_info_obj["current_dl"]),
-                        "timestamp": str(net_info_obj["timestamp"]),
-                    }
-                    updated_network_data.append(update_data)
-                await r.set('db_vllm2', json.dumps(updated_network_data))
-            else:
-                updated_network_data = []
-                for net_info_obj in current_network_info:
-                    update_data = {
-                        "container": str(net_info_obj["container"]),
-                        "info": str(net_info_obj["info"]),
-                        "current_dl": str(net_info_obj["current_dl"]),
-                        "timestamp": str(net_info_obj["timestamp"]),
-                    }
-                    updated_network_data.append(update_data)
-                    # print(f'[network] 2 updated_network_data: {updated_network_data}')
-                await r.set('db_vllm2', json.dumps(updated_network_data))
-            await asyncio.sleep(1.0)
-        except Exception as e:
-            print(f'[{datetime.now().strftime("%Y-%m-%d %H:%M:%S")}] Error: {e}')
-            logging.info(f'[{datetime.now().strftime("%Y-%m-%d %H:%M:%S")}] [redis_timer_network] {e}')
-            await asyncio.sleep(1.0)
+            response = await vllm_client["client"].get(READINESS_CONFIG["health_path"], timeout=min(delay + 1.0, 5.0))
+            # a 404 means the server is up but has no health route
+            if response.status_code < 500:
+                await readiness_report(vllmcontainer, "ready", attempt, started, f'http {response.status_code}')
+                print(f'[{datetime.now().strftime("%Y-%m-%d %H:%M:%S")}] [wait_vllm_ready] {vllmcontainer} ready after {time.monotonic() - started:.1f}s ({attempt} probes)')
+                return True
+            detail = f'http {response.status_code}'
+        except httpx.HTTPError as e:
+            detail = f'{type(e).__name__}'
+        if time.monotonic() - started + delay > timeout:
+            await readiness_report(vllmcontainer, "timeout", attempt, started, detail)
+            return False
+        await readiness_report(vllmcontainer, "starting", attempt, started, f'{detail} health {health}')
+        await asyncio.sleep(delay)
+        delay = min(delay * float(READINESS_CONFIG["backoff"]), float(READINESS_CONFIG["max_delay"]))
 
-async def redis_timer_vllm():
-    while True:
-        try:
-            total_vllm_info = get_vllm_info()
-            res_db_vllm = await r.get('db_vllm')
-            if res_db_vllm is not None:
-                db_vllm = json.loads(res_db_vllm)
-                updated_vllm_data = []
-                for vllm_i in range(0,len(total_vllm_info)):
-                    update_data = {
-                        "db_name": vllm_i,
-                        "vllm_id": vllm_i,
-                        "model": "redis_timer_vllm",
-                        "ts": str(datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
-                    }
-                    updated_vllm_data.append(update_data)
-                await r.set('db_vllm', json.dumps(updated_vllm_data))
-            else:
-                updated_vllm_data = []
-                for vllm_i in range(0,len(total_vllm_info)):
-                    update_data = {
-                        "db_name": vllm_i,
-                        "vllm_id": vllm_i,
-                        "model": "redis_timer_vllm",
-                        "ts": str(datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
-                    }
-                    updated_vllm_data.append(update_data)
-                await r.set('db_vllm', json.dumps(updated_vllm_data))
-            await asyncio.sleep(1.0)
-        except Exception as e:
-            print(f'[{datetime.now().strftime("%Y-%m-%d %H:%M:%S")}] Error: {e}')
-            await asyncio.sleep(1.0)
+def sse_event(data):
+    return f'data: {data if isinstance(data, str) else json.dumps(data)}\n\n'
+
+async def vllm_stream(req_data):
+    try:
+        if vllm_routed(req_data):
+            # a stream is bound to one replica once the first chunk is relayed, so it is only picked, never retried
+            replicas = await get_replicas(req_data["model"])
+            if not replicas:
+                yield sse_event({"error": f'no replica of {req_data["model"]} available'})
+                return
+            req_data = replica_req_data(req_data, replicas[0])
+        if not await vllm_ensure_running(req_data["vllmcontainer"]):
+            yield sse_event({"error": f'{req_data["vllmcontainer"]} could not be restarted'})
+            return
+        start = time.monotonic()
+        stream_stats = {"first_token": None, "text": "", "usage": {}}
+        async with vllm_admitted(req_data, req_data["prompt"]) as admission:
+            async for event in vllm_stream_request(req_data, stream_stats):
+                yield event
+        if stream_stats["first_token"] is not None:
+            await inference_metrics_record(req_data["vllmcontainer"], inference_sample(req_data["prompt"], stream_stats["text"], stream_stats["usage"], stream_stats["first_token"] - start, time.monotonic() - start, admission["queue_time"]))
+    except AdmissionRejected as e:
+        yield sse_event({"error": f'{e}', "retry_after": e.retry_after})
+    except Exception as e:
+        print(f'[{datetime.now().strftime("%Y-%m-%d %H:%M:%S")}] [vllm_stream] {e}')
+        yield sse_event({"error": f'{e}'})
+
+async def vllm_stream_request(req_data, stream_stats):
+    try:
+        if vllm_api(req_data) == "oai":
+            vllm_activity[req_data["vllmcontainer"]] = time.time()
+            vllm_client = get_vllm_client(req_data["vllmcontainer"], req_data["port"])
+            async with vllm_tracked(req_data["vllmcontainer"]), vllm_client["semaphore"]:
+                async with vllm_client["client"].stream("POST", "/v1/chat/completions", json={
+                    "model":req_data["model"],
+                    "messages": [
+                                    {
+                                        "role": "user",
+                                        "content": f'{req_data["prompt"]}'
+                                    }
+                    ],
+                    "temperature":float(req_data.get("temperature", 0.8)),
+                    "top_p":float(req_data.get("top_p", 0.95)),
+                    "max_tokens":int(req_data.get("max_tokens", 150)),
+                    "stream": True,
+                    "stream_options": {"include_usage": True}
+                }) as response:
+                    if response.status_code != 200:
+                        yield sse_event({"error": f'response.status_code {response.status_code}'})
+                        return
+                    async for line in response.aiter_lines():
+                        if not line.startswith("data:"):
+                            continue
+                        chunk_data = line[len("data:"):].strip()
+                        if chunk_data == "[DONE]":
+                            break
+                        chunk_json = json.loads(chunk_data)
+                        # the usage chunk comes last and has no choices
+                        if chunk_json.get("usage"):
+                            stream_stats["usage"] = chunk_json["usage"]
+                        if not chunk_json.get("choices"):
+                            continue
+                        chunk_delta = chunk_json["choices"][0].get("delta", {}).get("content")
+                        if chunk_delta:
+                            if stream_stats["first_token"] is None:
+                                stream_stats["first_token"] = time.monotonic()
+                            stream_stats["text"] += chunk_delta
+                            yield sse_event({"delta": chunk_delta})
+
+        elif vllm_api(req_data) == "xoo":
+            # the /vllm api of container_vllm_xoo answers in one piece, relayed as a single event
+            response = await vllm_post(req_data["vllmcontainer"], req_data["port"], "/vllm", {
+                "req_type":"generate",
+                "prompt":req_data["prompt"],
+                "temperature":float(req_data.get("temperature", 0.8)),
+                "top_p":float(req_data.get("top_p", 0.95)),
+                "max_tokens":int(req_data.get("max_tokens", 150))
+            })
+            if response.status_code != 200:
+                yield sse_event({"error": f'response.status_code {response.status_code}'})
+                return
+            response_json = response.json()
+            stream_stats["first_token"] = time.monotonic()
+            stream_stats["text"] = f'{response_json["result_data"]}'
+            stream_stats["usage"] = response_json.get("usage", {})
+            yield sse_event({"delta": stream_stats["text"]})
+
+        else:
+            yield sse_event({"error": f'{req_data["vllmcontainer"]} not found!'})
+            return
+
+        yield sse_event("[DONE]")
+    except Exception as e:
+        print(f'[{datetime.now().strftime("%Y-%m-%d %H:%M:%S")}] [vllm_stream] {e}')
+        yield sse_event({"error": f'{e}'})
+
+async def vllm_close_clients():
+    for base_url in list(vllm_clients.keys()):
+        vllm_client = vllm_clients.pop(base_url)
+        await vllm_client["client"].aclose()
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    asyncio.create_task(redis_timer_gpu())
-    asyncio.create_task(redis_timer_disk())
-    asyncio.create_task(redis_timer_network())
-    asyncio.create_task(redis_timer_vllm())
-    asyncio.create_task(redis_timer_vllm2())
+    await redis_wait_ready()
+    # subscribers drop seq numbers they have seen, so a restarted backend continues from the stored ones
+    res_seq = await r.hgetall(TELEMETRY_SEQ_KEY)
+    telemetry_seq.update({source_name.decode(): int(seq) for source_name, seq in res_seq.items()})
+    await asyncio.to_thread(inventory_reconcile)
+    threading.Thread(target=inventory_watch_events, name="docker_events", daemon=True).start()
+    collector_task = asyncio.create_task(collector_scheduler())
+    job_tasks = [asyncio.create_task(job_worker(worker_i)) for worker_i in range(int(JOB_CONFIG["workers"]))]
+    idle_task = asyncio.create_task(idle_reaper())
     yield
+    collector_task.cancel()
+    idle_task.cancel()
+    for placement_task in list(placement_tasks):
+        placement_task.cancel()
+    for job_task in job_tasks:
+        job_task.cancel()
+    await vllm_close_clients()
+    await redis_close()
 
 app = FastAPI(lifespan=lifespan)
 
@@ -738,193 +1789,639 @@ network_name = "sys_net"
 
 
 
-device_request = DeviceRequest(count=-1, capabilities=[["gpu"]])
-
 
 
-
-async def stop_vllm_container():
+PLACEMENT_CONFIG = defaults_backend['placement']
+
+# memory promised to containers that have not allocated it yet, per container name
+gpu_reservations = {}
+placement_lock = asyncio.Lock()
+
+def container_gpu_uuids(container_attrs):
+    res_uuids = []
+    for device_req in (container_attrs.get("HostConfig", {}).get("DeviceRequests") or []):
+        if device_req.get("Count") == -1:
+            return list(device_uuids)
+        for device_id in (device_req.get("DeviceIDs") or []):
+            res_uuids.append(device_uuids[int(device_id)] if str(device_id).isdigit() else device_id)
+    return res_uuids
+
+def placement_reserved():
+    now = time.monotonic()
+    for container_name in [k for k, v in gpu_reservations.items() if v["expires"] < now]:
+        gpu_reservations.pop(container_name, None)
+    reserved = {}
+    for reservation in gpu_reservations.values():
+        for gpu_uuid, reserved_bytes in reservation["bytes"].items():
+            reserved[gpu_uuid] = reserved.get(gpu_uuid, 0) + reserved_bytes
+    return reserved
+
+def placement_fit(gpu_info, tensor_parallel_size, gpu_memory_utilization, pinned=None):
+    # vllm claims gpu_memory_utilization of the total memory on each of its gpus
+    reserved = placement_reserved()
+    fits = []
+    for current_gpu_info in gpu_info:
+        gpu_uuid = current_gpu_info.get("current_uuid")
+        if pinned is not None and gpu_uuid not in pinned:
+            continue
+        required = current_gpu_info.get("mem_total", 0) * (gpu_memory_utilization + float(PLACEMENT_CONFIG["mem_margin"]))
+        available = current_gpu_info.get("mem_free", 0) - reserved.get(gpu_uuid, 0)
+        if available >= required:
+            fits.append((available - required, gpu_uuid))
+    if pinned is not None:
+        return list(pinned) if len(fits) == len(pinned) else None
+    if len(fits) < tensor_parallel_size:
+        return None
+    # best fit, the tightest gpus first so small models pack together and large gaps stay free
+    fits.sort()
+    return [gpu_uuid for _, gpu_uuid in fits[:tensor_parallel_size]]
+
+async def place_vllm(job_id, container_name, tensor_parallel_size, gpu_memory_utilization, pinned=None):
+    async with placement_lock:
+        loop = asyncio.get_running_loop()
+        while True:
+            gpu_info = await loop.run_in_executor(gpu_executor, get_gpu_info)
+            res_uuids = placement_fit(gpu_info, tensor_parallel_size, gpu_memory_utilization, pinned)
+            if res_uuids:
+                mem_total = {g.get("current_uuid"): g.get("mem_total", 0) for g in gpu_info}
+                gpu_reservations[container_name] = {
+                    "bytes": {gpu_uuid: int(mem_total.get(gpu_uuid, 0) * gpu_memory_utilization) for gpu_uuid in res_uuids},
+                    "expires": time.monotonic() + float(PLACEMENT_CONFIG["reservation_ttl"])
+                }
+                print(f'[{datetime.now().strftime("%Y-%m-%d %H:%M:%S")}] [place_vllm] {container_name} -> {res_uuids}')
+                return res_uuids
+            # no room, evict the least recently active vllm container (holding a pinned gpu if pinned).
+            # containers serving requests or being stopped/restarted are never taken
+            victims = [c for c in get_container_list(all=False) if inventory_name(c).startswith("container_vllm") and inventory_name(c) != container_name]
+            victims = [c for c in victims if not vllm_busy(inventory_name(c)) and not vllm_restart_locks.get(inventory_name(c), asyncio.Lock()).locked()]
+            if pinned is not None:
+                victims = [c for c in victims if set(container_gpu_uuids(c)) & set(pinned)]
+            if not gpu_info or not victims:
+                return None
+            victim = min(victims, key=lambda c: vllm_last_active(inventory_name(c), c))
+            await placement_evict(job_id, victim, vllm_last_active(inventory_name(victim), victim), container_name)
+
+async def placement_evict(job_id, victim, last_active, container_name):
+    victim_name = inventory_name(victim)
+    # the restart lock makes vllm_ensure_running wait for the stop instead of sending a prompt into it
+    async with vllm_restart_locks.setdefault(victim_name, asyncio.Lock()):
+        if vllm_busy(victim_name) or vllm_last_active(victim_name, victim) != last_active:
+            # a request came in since it was picked, the caller looks again
+            return
+        await job_progress(job_id, f'evicting {victim_name} to make room for {container_name}')
+        # routed like an idle container, restarted on its next prompt instead of counted as live
+        await registry_save(victim_name, {"status": "idle_stopped", "idle_since": last_active, "evicted_by": container_name}, mode="update")
+        await asyncio.to_thread(client.api.stop, victim["Id"])
+        await asyncio.to_thread(client.api.wait, victim["Id"])
+        await asyncio.to_thread(inventory_refresh, victim["Id"])
+        gpu_reservations.pop(victim_name, None)
+
+PORTS_CONFIG = defaults_backend['ports']
+PORTS_ALLOCATED_KEY = "ports:allocated"
+
+def inventory_host_ports():
+    # host ports bound by any container, running or not, since a stopped one takes its ports back on start
+    res_ports = set()
+    for container_attrs in get_container_list(all=True):
+        for bindings in (container_attrs.get("HostConfig", {}).get("PortBindings") or {}).values():
+            for binding in (bindings or []):
+                if str(binding.get("HostPort", "")).isdigit():
+                    res_ports.add(int(binding["HostPort"]))
+    return res_ports
+
+async def port_reclaim():
+    # drop allocations whose owner never showed up in the inventory within pending_ttl
+    container_names = {inventory_name(c) for c in get_container_list(all=True)}
+    res_allocated = await r.hgetall(PORTS_ALLOCATED_KEY)
+    stale = [port for port, allocation in res_allocated.items()
+             if json.loads(allocation)["owner"] not in container_names and time.time() - json.loads(allocation)["ts"] > float(PORTS_CONFIG["pending_ttl"])]
+    if stale:
+        await r.hdel(PORTS_ALLOCATED_KEY, *stale)
+
+async def port_allocate(owner, preferred=None):
+    await port_reclaim()
+    bound = inventory_host_ports()
+    port_start, port_end = PORTS_CONFIG["range"]
+    candidates = list(range(int(port_start), int(port_end) + 1))
+    if preferred and int(preferred) in candidates:
+        candidates.remove(int(preferred))
+        candidates.insert(0, int(preferred))
+    for port in candidates:
+        if port in bound:
+            continue
+        # hsetnx makes the claim atomic between concurrent create jobs
+        if await r.hsetnx(PORTS_ALLOCATED_KEY, port, json.dumps({"owner": owner, "ts": time.time()})):
+            return port
+    return None
+
+async def port_release(owner):
+    res_allocated = await r.hgetall(PORTS_ALLOCATED_KEY)
+    owned = [port for port, allocation in res_allocated.items() if json.loads(allocation)["owner"] == owner]
+    if owned:
+        await r.hdel(PORTS_ALLOCATED_KEY, *owned)
+    return [int(port) for port in owned]
+
+async def get_ports():
+    res_allocated = await r.hgetall(PORTS_ALLOCATED_KEY)
+    return {
+        "range": PORTS_CONFIG["range"],
+        "allocated": {int(port): json.loads(allocation) for port, allocation in res_allocated.items()},
+        "bound": sorted(inventory_host_ports())
+    }
+
+# the loop only keeps weak references to tasks, these are held here until they finish
+placement_tasks = set()
+
+async def placement_release_when_ready(container_name, port):
     try:
-        print(f' -> stop_vllm_container')
-        res_container_list = client.containers.list(all=True)
-        print(f'-> mhmmhmhmh 1')
-        vllm_containers_running = [c for c in res_container_list if c.name.startswith("container_vllm") and c.status == "running"]
-        print(f'-> found total vLLM running containers: {len(vllm_containers_running)}')
-        while len(vllm_containers_running) > 0:
-            print(f'stopping all vLLM containers...')
-            for vllm_container in vllm_containers_running:
-                print(f'-> stopping container {vllm_container.name}...')
-                vllm_container.stop()
-                vllm_container.wait()
-            res_container_list = client.containers.list(all=True)
-            vllm_containers_running = [c for c in res_container_list if c.name.startswith("vllm") and c.status == "running"]
-        print(f'-> all vLLM containers stopped successfully')
-        return 200
+        await wait_vllm_ready(container_name, port)
     except Exception as e:
-        print(f'-> error e: {e}') 
-        return 500
-
-
-
+        print(f'[{datetime.now().strftime("%Y-%m-%d %H:%M:%S")}] [placement_release_when_ready] {container_name} {e}')
+    finally:
+        gpu_reservations.pop(container_name, None)
 
+def placement_release_later(container_name, port):
+    placement_task = asyncio.create_task(placement_release_when_ready(container_name, port))
+    placement_tasks.add(placement_task)
+    placement_task.add_done_callback(placement_tasks.discard)
 
 
 
+JOB_CONFIG = defaults_backend['jobs']
 
+# lifecycle requests are queued as jobs, job state lives in redis under job:<job_id>
+job_queue = asyncio.Queue()
 
+def job_key(job_id):
+    return f'job:{job_id}'
 
+async def job_set(job_id, **fields):
+    fields["updated"] = time.time()
+    pipe = redis_pipeline()
+    pipe.hset(job_key(job_id), mapping={k: json.dumps(v) for k, v in fields.items()})
+    pipe.expire(job_key(job_id), int(JOB_CONFIG["ttl"]))
+    await pipe.execute()
 
+async def job_progress(job_id, progress):
+    print(f'[{datetime.now().strftime("%Y-%m-%d %H:%M:%S")}] [job] {job_id} {progress}')
+    # job_id is None when a lifecycle step runs outside a job, e.g. an idle restart
+    if job_id is not None:
+        await job_set(job_id, state="running", progress=progress)
 
+async def job_get(job_id):
+    res_job = await r.hgetall(job_key(job_id))
+    return {k.decode(): json.loads(v) for k, v in res_job.items()}
 
+async def job_submit(method, req_data):
+    job_id = uuid.uuid4().hex
+    await job_set(job_id, job_id=job_id, method=method, state="queued", progress="", created=time.time(), req_data=req_data)
+    await job_queue.put((job_id, method, req_data))
+    return job_id
 
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-def redis_connection(**kwargs):
-    try:
-        
-        print(f' ======== BACKEND HMMM [redis_connection] 1')
-        if not kwargs:
-            print(f' **REDIS: Error: no kwargs')
-            return False
-        # else:
-        #     print(f' **REDIS: kwargs: {kwargs}')
-        print(f' ======== BACKEND HMMM [redis_connection] 11 kwargs: {kwargs}')
-        print(f' ======== BACKEND HMMM [redis_connection] 2')
-        if not kwargs["db_name"]:
-            print(f' **REDIS: Error: no db_name')
-            return False
-        print(f' ======== BACKEND HMMM [redis_connection] 3')
-        if not kwargs["method"]:
-            print(f' **REDIS: Error: no method')
-            return False
-        print(f' ======== BACKEND HMMM [redis_connection] 4')
-        if not kwargs["select"]:
-            print(f' **REDIS: Error: no select')
-            return False
-        print(f' ======== BACKEND HMMM [redis_connection] 5')
-        res_db_list = r.lrange(kwargs["db_name"], 0, -1)
-        print(f' ======== BACKEND HMMM [redis_connection] 6')
-        print(f' ======== BACKEND HMMM [redis_connection] 6 res_db_list: {res_db_list}')
-        print(f' ======== BACKEND HMMM [redis_connection] 6 found {len(res_db_list)} entries!')
-        res_db_list = [json.loads(entry) for entry in res_db_list]
-        print(f' ======== BACKEND HMMM [redis_connection] 7')
-        
-        if kwargs["select"] == "filter":
-            if not kwargs["filter_key"]:
-                print(f' **REDIS: Error: no filter_key')
-                return False
-            
-            if not kwargs["filter_val"]:
-                print(f' **REDIS: Error: no filter_val')
-                return False
-
-            res_db_list = [entry for entry in res_db_list if entry[kwargs["filter_key"]] == kwargs["filter_val"]]
-            # print(f' **REDIS: filtered: {len(res_db_list)}')
-        print(f' ======== BACKEND HMMM [redis_connection] 8')
-        if kwargs["method"] == "get":
-            print(f' ======== BACKEND HMMM [redis_connection] 9')
-            return res_db_list
-            
-        if kwargs["method"] == "del_all":
-            if len(res_db_list) > 0:
-                update_i = 0
-                for entry in [json.dumps(entry) for entry in res_db_list]:
-                    r.lrem(kwargs["db_name"], 0, entry)
-                    update_i = update_i + 1
-                return res_db_list
-            else:
-                print(f' **REDIS: Error: no entry to delete for db_name: {kwargs["db_name"]}')
-                return False
-            
-        if kwargs["method"] == "update":
-            if len(res_db_list) > 0:
-                update_i = 0
-                for entry in [json.dumps(entry) for entry in res_db_list]:
-                    r.lrem(kwargs["db_name"], 0, entry)
-                    entry = json.loads(entry)
-                    # entry["ts"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                    entry["gpu"]["mem"] = f'blablabla + {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}'
-                    r.rpush(kwargs["db_name"], json.dumps(entry))
-                    update_i = update_i + 1
-                # print(f' **REDIS: updated ({update_i}/{len(res_db_list)})!')
-                return res_db_list
-            else:
-                print(f' **REDIS: Error: no entry to update for db_name: {kwargs["db_name"]}')
-                return False
-        
-        if kwargs["method"] == "save":
-            if not kwargs["data"]:
-                print(f' **REDIS: Error: no data to save')
-                return False
-            if not kwargs["data"]["uid"]:
-                print(f' **REDIS: Error: no uid')
-                return False
+async def job_worker(worker_i):
+    while True:
+        job_id, method, req_data = await job_queue.get()
+        try:
+            await job_set(job_id, state="running", started=time.time())
+            res_job = await LIFECYCLE_JOBS[method](job_id, req_data)
+            await job_set(job_id, state="done" if res_job.get("result_status", res_job.get("result")) == 200 else "failed", progress="", result=res_job)
+        except Exception as e:
+            print(f'[{datetime.now().strftime("%Y-%m-%d %H:%M:%S")}] [job_worker] {worker_i} {job_id} {e}')
+            await job_set(job_id, state="failed", result={"result_status": 500, "result_data": f'{e}'})
+        finally:
+            job_queue.task_done()
+
+async def lifecycle_delete(job_id, req_data):
+    req_container = await asyncio.to_thread(client.containers.get, req_data["model"])
+    await job_progress(job_id, f'stopping {req_data["model"]}')
+    await asyncio.to_thread(req_container.stop)
+    await job_progress(job_id, f'removing {req_data["model"]}')
+    await asyncio.to_thread(req_container.remove, force=True)
+    await port_release(req_data["model"])
+    await registry_delete(req_data["model"])
+    admission_invalidate(req_data["model"])
+    return {"result": 200}
+
+async def lifecycle_stop(job_id, req_data):
+    req_container = await asyncio.to_thread(client.containers.get, req_data["model"])
+    await job_progress(job_id, f'stopping {req_data["model"]}')
+    await asyncio.to_thread(req_container.stop)
+    return {"result": 200}
+
+async def lifecycle_start(job_id, req_data):
+    req_container = await asyncio.to_thread(client.containers.get, req_data["model"])
+    await job_progress(job_id, f'starting {req_data["model"]}')
+    await asyncio.to_thread(req_container.start)
+    await registry_save(req_data["model"], {"status": "running"}, mode="update")
+    return {"result": 200}
+
+async def lifecycle_load(job_id, req_data):
+    print(f' * ! * ! * trying to load ....  0 ')
+    # VLLM_URL = f'http://container_vllm_xoo:{os.getenv("VLLM_PORT")}/vllm'
+    # if req_data["vllmcontainer"] == "container_vllm_xoo":  ....
+
+    # check if container exists with this model if yes start ..
+    if req_data["vllmcontainer"] == "container_vllm_oai":
+        return {"result_status": 500, "result_data": f'vllm/vllm-openai:latest load not supported!'}
+    # if req_data["vllmcontainer"] == "container_vllm_xoo":
+    if req_data["vllmcontainer"]:
+        container_attrs = await asyncio.to_thread(client.api.inspect_container, req_data["vllmcontainer"])
+        if container_attrs["State"]["Status"] == "running":
+            # the model it serves now holds the memory the new one is placed into
+            await job_progress(job_id, f'stopping {req_data["vllmcontainer"]}')
+            await asyncio.to_thread(client.api.stop, container_attrs["Id"])
+            await asyncio.to_thread(client.api.wait, container_attrs["Id"])
+            await asyncio.to_thread(inventory_refresh, container_attrs["Id"])
+        await job_progress(job_id, "placing on gpus")
+        # a container started with count=-1 sees every gpu and vllm uses the first tensor_parallel_size of them
+        pinned = container_gpu_uuids(container_attrs)[:int(req_data["tensor_parallel_size"])]
+        if not await place_vllm(job_id, req_data["vllmcontainer"], int(req_data["tensor_parallel_size"]), float(req_data["gpu_memory_utilization"]), pinned):
+            return {"result_status": 507, "result_data": f'no gpu room for {req_data["vllmcontainer"]} on {pinned}'}
+        print(f'  * ! * ! *  starting container_vllm_xoo ...')
+        await job_progress(job_id, f'starting {req_data["vllmcontainer"]}')
+        req_container = await asyncio.to_thread(client.containers.get, req_data["vllmcontainer"])
+        print(f'  * ! * ! *  is started? [{datetime.now().strftime("%Y-%m-%d %H:%M:%S")}] ...')
+        await asyncio.to_thread(req_container.start)
+        # the start event may not have reached the inventory yet, readiness reads the state from it
+        await asyncio.to_thread(inventory_refresh, req_data["vllmcontainer"])
+        print(f'  * ! * ! *  is started? [{datetime.now().strftime("%Y-%m-%d %H:%M:%S")}] ... waiting for readiness')
+        await job_progress(job_id, "waiting for readiness")
+        if not await wait_vllm_ready(req_data["vllmcontainer"], req_data["port"], req_data.get("timeout")):
+            res_readiness = await get_readiness(req_data["vllmcontainer"])
+            return {"result_status": 504, "result_data": f'{req_data["vllmcontainer"]} not ready: {res_readiness}'}
+        print(f'  * ! * ! *  is started? [{datetime.now().strftime("%Y-%m-%d %H:%M:%S")}] ... ready! loading ...')
+        await job_progress(job_id, f'loading {req_data["model"]}')
+        VLLM_URL = f'http://{req_data["vllmcontainer"]}:{req_data["port"]}/vllm'
+        print(f' * ! * ! * trying to load ....  1 VLLM_URL {VLLM_URL}')
+        try:
+            response = await vllm_post(req_data["vllmcontainer"], req_data["port"], "/vllm", {
+                "req_type":"load",
+                "max_model_len":int(req_data["max_model_len"]),
+                "tensor_parallel_size":int(req_data["tensor_parallel_size"]),
+                "gpu_memory_utilization":float(req_data["gpu_memory_utilization"]),
+                "model":str(req_data["model"])
+            })
+            gpu_reservations.pop(req_data["vllmcontainer"], None)
+            print(f' * ! * ! * trying to load ....  3 response {response}')
+            if response.status_code == 200:
+                print(f' * ! * ! * trying to load ....  4 status_code: {response.status_code}')
+
+                response_json = response.json()
+                print(f' * ! * ! * trying to load ....  5 response_json: {response_json}')
+                print(f' * ! * ! * trying to load ....  6 response_json["result_data"]: {response_json["result_data"]}')
+                return {"result_status": 200, "result_data": f'{response_json["result_data"]}'}
             else:
-                print(f' **REDIS: YES GOT DATA UIDS!')
-
-                
-            # print(f' **REDIS: trying to get all uids ...')
-            curr_uids = [entry["uid"] for entry in res_db_list]
-            # print(f' **REDIS: found curr_uids: {len(curr_uids)}')
-
-            if kwargs["data"]["uid"] in curr_uids:
-                print(f' **REDIS: Error: vllm already saved!')
-                return False
+                print(f' * ! * ! * trying to load .... 7 ERRRRR')
+                return {"result_status": 500, "result_data": f'ERRRRRR'}
+        except Exception as e:
+                print(f' * ! * ! * trying to load .... 8 ERRRRR')
+                return {"result_status": 500, "result_data": f'ERRRRRR 8'}
+    return {"result_status": 500, "result_data": f'{req_data["vllmcontainer"]} load not supported!'}
+
+async def lifecycle_register(container_name, container_id, req_data, gpu_uuids):
+    res_registered = {
+        "container_name": container_name,
+        "container_id": str(container_id),
+        "image": req_data["image"],
+        "model": req_data["model"],
+        "port": req_data["port"],
+        "gpu_uuids": gpu_uuids,
+        "tensor_parallel_size": req_data["tensor_parallel_size"],
+        "gpu_memory_utilization": req_data["gpu_memory_utilization"],
+        "max_model_len": req_data["max_model_len"],
+        "status": "created"
+    }
+    await registry_save(container_name, res_registered, mode="upsert")
+    await admission_refresh(container_name)
+    return res_registered
+
+async def lifecycle_create(job_id, req_data):
+    req_container_name = str(req_data["model"]).replace('/', '_')
+    req_container_name = req_container_name.split('_')[0]
+    ts = str(int(datetime.now().timestamp()))
+    req_container_name = f'container_vllm_{req_container_name}_{ts}'
+    try:
 
-            
-            save_data = kwargs["data"]
-            
-            
-            # bbbbb
-            data_obj = {
-                "container_name": save_data.get("container_name", "err_container_name"),
-                "uid": save_data.get("uid", "00000000000"),
-                "State": {
-                    "Status": "running"
+        # req_container_name = f'container_vllm_asdf'
+
+        print(f' !!!!! calling req_container_name: {req_container_name}')
+
+        if req_data["image"] == "vllm/vllm-openai:latest":
+            print(f' !!!!! create found "vllm/vllm-openai:latest" !')
+
+        if "xoo4foo/" in req_data["image"]:
+            print(f' !!!!! create found "xoo4foo/" !')
+
+        await job_progress(job_id, "allocating port")
+        res_port = await port_allocate(req_container_name, req_data.get("port"))
+        if res_port is None:
+            return {"result_status": 503, "result_data": f'no free port in {PORTS_CONFIG["range"]}'}
+        if str(res_port) != str(req_data.get("port")):
+            print(f' ************ port {req_data.get("port")} is taken, using {res_port}')
+        req_data = dict(req_data, port=res_port)
+
+        await job_progress(job_id, "placing on gpus")
+        res_gpu_uuids = await place_vllm(job_id, req_container_name, int(req_data["tensor_parallel_size"]), float(req_data["gpu_memory_utilization"]))
+        if not res_gpu_uuids:
+            await port_release(req_container_name)
+            return {"result_status": 507, "result_data": f'no gpu room for tensor_parallel_size {req_data["tensor_parallel_size"]} at gpu_memory_utilization {req_data["gpu_memory_utilization"]}'}
+        print(f' ************ placing {req_container_name} on {res_gpu_uuids}')
+
+        if req_data["image"] == "vllm/vllm-openai:latest":
+            print(f' !!!!! create found "vllm/vllm-openai:latest" !')
+            await job_progress(job_id, f'running {req_container_name}')
+            res_container = await asyncio.to_thread(client.containers.run,
+                build={"context": f'./{req_container_name}'},
+                image=req_data["image"],
+                runtime=req_data["runtime"],
+                ports={
+                    f'{req_data["port"]}/tcp': ("0.0.0.0", req_data["port"])
                 },
-                "gpu": {
-                    "mem": save_data.get("gpu", {}).get("mem", "err_gpu_mem")
+                container_name=f'{req_container_name}',
+                volumes={
+                    "/logs": {"bind": "/logs", "mode": "rw"},
+                    "/home/cloud/.cache/huggingface": {"bind": "/root/.cache/huggingface", "mode": "rw"},
+                    "/models": {"bind": "/root/.cache/huggingface/hub", "mode": "rw"}
                 },
-                "ts": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            }        
-            r.rpush(kwargs["db_name"], json.dumps(data_obj))
-            # print(f' **REDIS: saved!')
-            return res_db_list
-        
-        return False
-    
+                shm_size=f'{req_data["shm_size"]}',
+                network=network_name,
+                environment={
+                    "NCCL_DEBUG": "INFO"
+                },
+                device_requests=[
+                    docker.types.DeviceRequest(device_ids=res_gpu_uuids, capabilities=[['gpu']])
+                ],
+                command=[
+                    f'--model {req_data["model"]}',
+                    f'--port {req_data["port"]}',
+                    f'--tensor-parallel-size {req_data["tensor_parallel_size"]}',
+                    f'--gpu-memory-utilization {req_data["gpu_memory_utilization"]}',
+                    f'--max-model-len {req_data["max_model_len"]}'
+                ]
+            )
+            container_id = res_container.id
+            placement_release_later(req_container_name, req_data["port"])
+            return {"result_status": 200, "result_data": await lifecycle_register(req_container_name, container_id, req_data, res_gpu_uuids)}
+
+        if "xoo4foo/" in req_data["image"]:
+            print(f' !!!!! create found "xoo4foo/" !')
+            print(f' !!!!! using req_container_name: {req_container_name} !')
+
+            await job_progress(job_id, f'running {req_container_name}')
+            res_container = await asyncio.to_thread(client.containers.run,
+                image=req_data["image"],
+                name=req_container_name,
+                runtime=req_data["runtime"],
+                shm_size=req_data["shm_size"],
+                network=network_name,
+                detach=True,
+                environment={
+                    'NCCL_DEBUG': 'INFO',
+                    'VLLM_PORT': req_data["port"]
+                },
+                device_requests=[
+                    docker.types.DeviceRequest(device_ids=res_gpu_uuids, capabilities=[['gpu']])
+                ],
+                ports={f'{req_data["port"]}': req_data["port"]},
+                volumes={
+                    '/logs': {'bind': '/logs', 'mode': 'rw'},
+                    '/models': {'bind': '/models', 'mode': 'rw'}
+                },
+                command=[
+                    "python", "app.py",
+                    "--model", req_data["model"],
+                    "--port", str(req_data["port"]),
+                    "--tensor-parallel-size", str(req_data["tensor_parallel_size"]),
+                    "--gpu-memory-utilization", str(req_data["gpu_memory_utilization"]),
+                    "--max-model-len", str(req_data["max_model_len"])
+                ]
+            )
+
+            container_id = res_container.id
+            placement_release_later(req_container_name, req_data["port"])
+            return {"result_status": 200, "result_data": await lifecycle_register(req_container_name, container_id, req_data, res_gpu_uuids)}
+
+        await port_release(req_container_name)
+        return {"result_status": 404, "result_data": f'{req_data["image"]} not supported!'}
     except Exception as e:
-        print(f' **REDIS: Error: {e}')
-        return False
-
-
-
-
-req_db = "db_test28"
-
-
-
-
-
-
+        gpu_reservations.pop(req_container_name, None)
+        await port_release(req_container_name)
+        print(f'[{datetime.now().strftime("%Y-%m-%d %H:%M:%S")}] {e}')
+        return {"result_status": 500, "result_data": f'{e}'}
 
+IDLE_CONFIG = defaults_backend['idle']
+VLLM_ACTIVITY_KEY = "vllm_activity"
+IDLE_STATUSES = ["created", "running"]
 
+# last proxied request per container (unix seconds), persisted to redis by the idle reaper
+vllm_activity = {}
+vllm_restart_locks = {}
 
+def container_started_at(container_attrs):
+    started_at = container_attrs.get("State", {}).get("StartedAt", "")
+    try:
+        return calendar.timegm(time.strptime(started_at[:19], "%Y-%m-%dT%H:%M:%S"))
+    except ValueError:
+        return 0.0
+
+def vllm_busy(vllmcontainer):
+    admission_queue = admission_queues.get(vllmcontainer)
+    return vllm_outstanding.get(vllmcontainer, 0) > 0 or (admission_queue is not None and (admission_queue.in_flight > 0 or len(admission_queue.waiters) > 0))
+
+def vllm_last_active(vllmcontainer, container_attrs):
+    # a container that was just (re)started counts as active
+    return max(vllm_activity.get(vllmcontainer, 0.0), container_started_at(container_attrs))
+
+async def idle_stop(vllmcontainer, container_attrs, idle_ttl):
+    # holds the restart lock so vllm_ensure_running waits for the stop instead of passing a container about to go down
+    async with vllm_restart_locks.setdefault(vllmcontainer, asyncio.Lock()):
+        # checked again right before the stop, a prompt may have come in since the reap pass
+        last_active = vllm_last_active(vllmcontainer, container_attrs)
+        if vllm_busy(vllmcontainer) or time.time() - last_active < idle_ttl:
+            return
+        print(f'[{datetime.now().strftime("%Y-%m-%d %H:%M:%S")}] [idle_reap] {vllmcontainer} idle for {time.time() - last_active:.0f}s, stopping')
+        await registry_save(vllmcontainer, {"status": "idle_stopped", "idle_since": last_active}, mode="update")
+        await asyncio.to_thread(client.api.stop, container_attrs["Id"])
+        await asyncio.to_thread(inventory_refresh, container_attrs["Id"])
+
+async def idle_reap():
+    now = time.time()
+    running = {inventory_name(c): c for c in get_container_list(all=False) if inventory_name(c).startswith("container_vllm")}
+    for vllm_entry in await registry_get_many(list(running.keys())):
+        container_name = vllm_entry["vllm_id"]
+        if vllm_entry.get("status") not in IDLE_STATUSES:
+            continue
+        idle_ttl = float(vllm_entry.get("idle_ttl", IDLE_CONFIG["ttl"]))
+        if idle_ttl <= 0:
+            continue
+        if vllm_busy(container_name) or now - vllm_last_active(container_name, running[container_name]) < idle_ttl:
+            continue
+        await idle_stop(container_name, running[container_name], idle_ttl)
+
+async def idle_reaper():
+    res_activity = await r.hgetall(VLLM_ACTIVITY_KEY)
+    for container_name, last_active in res_activity.items():
+        vllm_activity.setdefault(container_name.decode(), float(last_active))
+    while True:
+        await asyncio.sleep(float(IDLE_CONFIG["check_interval"]))
+        try:
+            if vllm_activity:
+                await r.hset(VLLM_ACTIVITY_KEY, mapping={k: str(v) for k, v in vllm_activity.items()})
+            if IDLE_CONFIG["enabled"]:
+                await idle_reap()
+        except Exception as e:
+            print(f'[{datetime.now().strftime("%Y-%m-%d %H:%M:%S")}] [idle_reaper] {e}')
+
+async def vllm_ensure_running(vllmcontainer):
+    # restarts a container stopped by the idle reaper, concurrent prompts share one restart
+    restart_lock = vllm_restart_locks.get(vllmcontainer)
+    if restart_lock is not None and restart_lock.locked():
+        # an idle stop or a restart is in progress, look at the container once it is done
+        async with restart_lock:
+            pass
+    container_attrs = next((c for c in get_container_list(all=True) if inventory_name(c) == vllmcontainer), None)
+    if container_attrs is None or container_attrs["State"]["Status"] == "running":
+        # marks it active before the request is tracked, so a pending idle stop backs off
+        vllm_activity[vllmcontainer] = time.time()
+        return True
+    vllm_entry = await registry_get(vllmcontainer)
+    if not vllm_entry or vllm_entry.get("status") != "idle_stopped":
+        return True
+    restart_lock = vllm_restart_locks.setdefault(vllmcontainer, asyncio.Lock())
+    async with restart_lock:
+        vllm_entry = await registry_get(vllmcontainer)
+        if vllm_entry.get("status") != "idle_stopped":
+            return vllm_entry.get("status") in IDLE_STATUSES
+        print(f'[{datetime.now().strftime("%Y-%m-%d %H:%M:%S")}] [vllm_ensure_running] restarting idle {vllmcontainer}')
+        pinned = container_gpu_uuids(container_attrs)[:int(vllm_entry["tensor_parallel_size"])]
+        if not await place_vllm(None, vllmcontainer, int(vllm_entry["tensor_parallel_size"]), float(vllm_entry["gpu_memory_utilization"]), pinned):
+            return False
+        try:
+            await asyncio.to_thread(client.api.start, container_attrs["Id"])
+            await asyncio.to_thread(inventory_refresh, container_attrs["Id"])
+            res_ready = await wait_vllm_ready(vllmcontainer, vllm_entry["port"])
+        finally:
+            gpu_reservations.pop(vllmcontainer, None)
+        if res_ready:
+            vllm_activity[vllmcontainer] = time.time()
+            await registry_save(vllmcontainer, {"status": "running"}, mode="update")
+        return res_ready
+
+LIFECYCLE_JOBS = {
+    "create": lifecycle_create,
+    "load": lifecycle_load,
+    "stop": lifecycle_stop,
+    "start": lifecycle_start,
+    "delete": lifecycle_delete
+}
 
 
                     
+OPENMETRICS_PREFIX = "gvllm"
+
+def openmetrics_escape(val):
+    return str(val).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def openmetrics_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{openmetrics_escape(v)}"' for k, v in labels.items()) + "}"
+
+def openmetrics_value(value):
+    if isinstance(value, int) and not isinstance(value, bool):
+        return str(value)
+    value = float(value)
+    # python spells these nan/inf, the exposition format only accepts NaN/+Inf/-Inf
+    if math.isnan(value):
+        return "NaN"
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(value)
+
+class OpenMetricsWriter:
+    """Collects metric families and renders them in the OpenMetrics text format."""
+
+    def __init__(self):
+        self.lines = []
+
+    def family(self, name, metric_type, help_text, samples, unit=None):
+        # samples: [(suffix, labels, value)], nothing is written for an empty family
+        if not samples:
+            return
+        name = f'{OPENMETRICS_PREFIX}_{name}'
+        self.lines.append(f'# TYPE {name} {metric_type}')
+        if unit:
+            self.lines.append(f'# UNIT {name} {unit}')
+        self.lines.append(f'# HELP {name} {help_text}')
+        for suffix, labels, value in samples:
+            self.lines.append(f'{name}{suffix}{openmetrics_labels(labels)} {openmetrics_value(value)}')
+
+    def render(self):
+        return "\n".join(self.lines + ["# EOF"]) + "\n"
+
+def render_openmetrics():
+    writer = OpenMetricsWriter()
+
+    gpu_info = collector_latest.get("gpu") or []
+    gpu_labels = lambda g: {"gpu": g.get("gpu_i"), "uuid": g.get("current_uuid"), "name": g.get("name")}
+    for field, name, unit, help_text in [
+        ("gpu_util", "gpu_utilization_percent", "percent", "GPU utilization"),
+        ("mem_util", "gpu_memory_utilization_percent", "percent", "GPU memory used of total"),
+        ("mem_used", "gpu_memory_used_bytes", "bytes", "GPU memory used"),
+        ("mem_total", "gpu_memory_total_bytes", "bytes", "GPU memory total"),
+        ("power_usage", "gpu_power_watts", "watts", "GPU power draw"),
+        ("temperature", "gpu_temperature_celsius", "celsius", "GPU temperature"),
+        ("fan_speed", "gpu_fan_speed_percent", "percent", "GPU fan speed")
+    ]:
+        writer.family(name, "gauge", help_text, [("", gpu_labels(g), g[field]) for g in gpu_info if g.get(field) is not None], unit)
+
+    network_info = [n for n in (collector_latest.get("network") or []) if "rx_bytes" in n]
+    writer.family("network_receive_bytes", "counter", "Bytes received per container or nic", [("_total", {"container": n["container"]}, n["rx_bytes"]) for n in network_info], "bytes")
+    writer.family("network_transmit_bytes", "counter", "Bytes sent per container or nic", [("_total", {"container": n["container"]}, n["tx_bytes"]) for n in network_info], "bytes")
+    writer.family("network_receive_rate_bytes_per_second", "gauge", "Receive rate per container or nic", [("", {"container": n["container"]}, n.get("rx_rate", 0.0)) for n in network_info], "bytes_per_second")
+
+    disk_info = collector_latest.get("disk") or []
+    disk_labels = lambda d: {"device": d.get("device"), "mountpoint": d.get("mountpoint")}
+    writer.family("disk_used_bytes", "gauge", "Disk space used", [("", disk_labels(d), d["used_bytes"]) for d in disk_info], "bytes")
+    writer.family("disk_free_bytes", "gauge", "Disk space free", [("", disk_labels(d), d["free_bytes"]) for d in disk_info], "bytes")
+    writer.family("disk_read_rate_bytes_per_second", "gauge", "Disk read rate", [("", disk_labels(d), d["read_bytes_rate"]) for d in disk_info], "bytes_per_second")
+    writer.family("disk_write_rate_bytes_per_second", "gauge", "Disk write rate", [("", disk_labels(d), d["write_bytes_rate"]) for d in disk_info], "bytes_per_second")
+
+    writer.family("collector_ticks", "counter", "Collector scheduler ticks", [("_total", {}, collector_stats["ticks"])])
+    writer.family("collector_overruns", "counter", "Collector ticks longer than the shortest due interval", [("_total", {}, collector_stats["overruns"])])
+    writer.family("collector_tick_duration_seconds", "gauge", "Duration of the last collector tick", [("", {}, collector_stats["tick_duration"])], "seconds")
+    writer.family("collector_source_duration_seconds", "gauge", "Duration of the last run per source", [("", {"source": k}, v["duration"]) for k, v in collector_stats["sources"].items()], "seconds")
+    writer.family("collector_source_errors", "counter", "Collector errors per source", [("_total", {"source": k}, v["errors"]) for k, v in collector_stats["sources"].items()])
+
+    writer.family("proxy_outstanding_requests", "gauge", "Requests in flight per vLLM container", [("", {"container": k}, v) for k, v in vllm_outstanding.items()])
+    admission_snapshots = [q.snapshot() for q in admission_queues.values()]
+    writer.family("proxy_queued_requests", "gauge", "Requests waiting for admission per vLLM container", [("", {"container": a["vllmcontainer"]}, a["queued"]) for a in admission_snapshots])
+    writer.family("proxy_rejected_requests", "counter", "Requests rejected by admission control", [("_total", {"container": a["vllmcontainer"]}, a["rejected"]) for a in admission_snapshots])
+    writer.family("jobs_queued", "gauge", "Lifecycle jobs waiting for a worker", [("", {}, job_queue.qsize())])
+
+    for metric, unit in [("ttft", "seconds"), ("latency", "seconds"), ("queue_time", "seconds"), ("tokens_per_sec", None), ("completion_tokens", None)]:
+        samples = []
+        for (vllmcontainer, hist_metric), hist in sorted(inference_histograms.items()):
+            if hist_metric != metric:
+                continue
+            cumulative = 0
+            # a bucket's upper bound is the lower bound of the next one
+            for bucket in sorted(hist["buckets"], key=lambda b: -math.inf if b == "zero" else int(b[1:])):
+                cumulative += hist["buckets"][bucket]
+                le = 0.0 if bucket == "zero" else float(INFERENCE_METRICS_CONFIG["bucket_base"]) ** (int(bucket[1:]) + 1)
+                samples.append(("_bucket", {"container": vllmcontainer, "le": f'{le:.6g}'}, cumulative))
+            samples.append(("_bucket", {"container": vllmcontainer, "le": "+Inf"}, hist["count"]))
+            samples.append(("_count", {"container": vllmcontainer}, hist["count"]))
+            samples.append(("_sum", {"container": vllmcontainer}, hist["sum"]))
+        name = f'proxy_{metric}_{unit}' if unit else f'proxy_{metric}'
+        writer.family(name, "histogram", f'Generate proxy {metric.replace("_", " ")} per vLLM container', samples, unit)
+
+    return writer.render()
+
+@app.get("/metrics")
+async def metrics():
+    return Response(render_openmetrics(), media_type="application/openmetrics-text; version=1.0.0; charset=utf-8")
+
 @app.get("/")
 async def root():
     return f'Hello from server {os.getenv("BACKEND_PORT")}!'
@@ -946,14 +2443,13 @@ async def fnredis(request: Request):
         if req_data["method"] == "test":
             print(f'[{datetime.now().strftime("%Y-%m-%d %H:%M:%S")}] >>>> [redis] trying to get docker vllm container ...')
             logging.info(f'[{datetime.now().strftime("%Y-%m-%d %H:%M:%S")}] >>>> [redis] trying to get docker vllm container ...')
-            res_container_list = client.containers.list(all=True)
+            res_container_list_attr = get_container_list(all=True)
             
             # print(f'[{datetime.now().strftime("%Y-%m-%d %H:%M:%S")}] >>>> [redis] res_container_list: {res_container_list}')
             # logging.info(f'[{datetime.now().strftime("%Y-%m-%d %H:%M:%S")}] >>>> [redis] res_container_list: {res_container_list}')
             
             
             
-            res_container_list_attr = [container.attrs for container in res_container_list]
             
             # print(f'[{datetime.now().strftime("%Y-%m-%d %H:%M:%S")}] >>>> [redis] res_container_list_attr: {res_container_list_attr}')
             # logging.info(f'[{datetime.now().strftime("%Y-%m-%d %H:%M:%S")}] >>>> [redis] res_container_list_attr: {res_container_list_attr}')
@@ -1086,25 +2582,58 @@ async def fnredis(request: Request):
             # return JSONResponse({"result_status": 200, "result_data": res_data})
   
         if req_data["method"] == "vllm":
-            
-            print(f'[{datetime.now().strftime("%Y-%m-%d %H:%M:%S")}] >>>> [redis] method == vllm ... trying request database ....')
-            logging.info(f'[{datetime.now().strftime("%Y-%m-%d %H:%M:%S")}] >>>> [redis] method == vllm ... trying request database ....')
-            
-            
-            test_call_get = {
-                "db_name": req_db,
-                "method": "get",
-                "select": "all"
-            }
-            
-            res_vllm_list = redis_connection(**test_call_get)
-            
-            print(f'[{datetime.now().strftime("%Y-%m-%d %H:%M:%S")}] >>>> [redis] returning ... res_vllm_list: {res_vllm_list}')
-            logging.info(f'[{datetime.now().strftime("%Y-%m-%d %H:%M:%S")}] >>>> [redis] returning ... res_vllm_list: {res_vllm_list}')
-            
-            
+            res_vllm_list = await registry_find()
             return JSONResponse({"result_status": 200, "result_data": res_vllm_list})
-            # return JSONResponse(res_vllm_list)
+
+        if req_data["method"] == "registry_get":
+            res_vllm = await registry_get(req_data["vllm_id"])
+            if res_vllm is None:
+                return JSONResponse({"result_status": 404, "result_data": f'{req_data["vllm_id"]} not found!'})
+            return JSONResponse({"result_status": 200, "result_data": res_vllm})
+
+        if req_data["method"] == "registry_find":
+            res_vllm_list = await registry_find(**req_data.get("filters", {}))
+            return JSONResponse({"result_status": 200, "result_data": res_vllm_list})
+
+        if req_data["method"] in ["registry_save", "registry_update", "registry_create"]:
+            req_mode = {"registry_save": "upsert", "registry_update": "update", "registry_create": "create"}[req_data["method"]]
+            res_saved = await registry_save(req_data["vllm_id"], req_data.get("data", {}), req_mode)
+            await admission_refresh(req_data["vllm_id"])
+            if not res_saved:
+                return JSONResponse({"result_status": 409 if req_mode == "create" else 404, "result_data": f'{req_data["method"]} failed for {req_data["vllm_id"]}'})
+            return JSONResponse({"result_status": 200, "result_data": await registry_get(req_data["vllm_id"])})
+
+        if req_data["method"] == "registry_delete":
+            res_deleted = await registry_delete(req_data["vllm_id"])
+            admission_invalidate(req_data["vllm_id"])
+            return JSONResponse({"result_status": 200 if res_deleted else 404, "result_data": res_deleted})
+
+        if req_data["method"] == "inference_metrics":
+            return JSONResponse({"result_status": 200, "result_data": await get_inference_metrics(req_data.get("vllmcontainer"))})
+
+        if req_data["method"] == "admission":
+            return JSONResponse({"result_status": 200, "result_data": [admission_queue.snapshot() for admission_queue in admission_queues.values()]})
+
+        if req_data["method"] == "replicas":
+            return JSONResponse({"result_status": 200, "result_data": await get_replicas(req_data["model"])})
+
+        if req_data["method"] == "ports":
+            return JSONResponse({"result_status": 200, "result_data": await get_ports()})
+
+        if req_data["method"] == "readiness":
+            return JSONResponse({"result_status": 200, "result_data": await get_readiness(req_data["vllmcontainer"])})
+
+        if req_data["method"] == "cache_stats":
+            return JSONResponse({"result_status": 200, "result_data": await get_generate_cache_stats()})
+
+        if req_data["method"] == "history":
+            # {"method": "history", "source": "gpu", "series": "0", "start": unix_s, "end": unix_s, "tier": "10s"}
+            req_end = float(req_data.get("end", time.time()))
+            req_start = float(req_data.get("start", req_end - 600))
+            if req_data.get("source") not in HISTORY_CONFIG["series"]:
+                return JSONResponse({"result_status": 404, "result_data": f'unknown source {req_data.get("source")}'})
+            res_history = await get_history(req_data["source"], req_data["series"], req_start, req_end, req_data.get("tier"), req_data.get("count"))
+            return JSONResponse({"result_status": 200, "result_data": res_history})
             
 
 
@@ -1125,72 +2654,29 @@ async def fndocker(request: Request):
             print(f'[{datetime.now().strftime("%Y-%m-%d %H:%M:%S")}] [docker] generate >>>>>>>>>>>')
             logging.info(f'[{datetime.now().strftime("%Y-%m-%d %H:%M:%S")}] [docker] generate >>>>>>>>>>> ')
 
-            if req_data["vllmcontainer"] == "container_vllm_oai":
-                VLLM_URL = f'http://{req_data["vllmcontainer"]}:{req_data["port"]}/v1/chat/completions'
-                print(f'trying request vllm with da URL: {VLLM_URL}')
-                try:
-                    response = requests.post(VLLM_URL, json={
-                        "model":req_data["model"],
-                        "messages": [
-                                        {
-                                            "role": "user",
-                                            "content": f'{req_data["prompt"]}'
-                                        }
-                        ]
-                    })
-                    print(f'[{datetime.now().strftime("%Y-%m-%d %H:%M:%S")}] [docker] response: {response}')
-                    logging.info(f' [docker]  response: {response}') 
-                    if response.status_code == 200:
-                        print(f'[{datetime.now().strftime("%Y-%m-%d %H:%M:%S")}] [docker] status_code: {response.status_code}')
-                        logging.info(f' [docker]  status_code: {response.status_code}') 
-                        
-                        
-                        response_json = response.json()
-                        print(f'[{datetime.now().strftime("%Y-%m-%d %H:%M:%S")}] [docker] response_json: {response_json}')
-                        logging.info(f' [docker]  response_json: {response_json}') 
-                        
-                        
-                        message_content = response_json["choices"][0]["message"]["content"]
-                        print(f'[{datetime.now().strftime("%Y-%m-%d %H:%M:%S")}] [docker] message_content: {message_content}')
-                        logging.info(f' [docker]  message_content: {message_content}') 
-                        
-                        return JSONResponse({"result_status": 200, "result_data": f'{message_content}'})              
-                    else:
-                        logging.info(f' [docker] response: {response}')
-                        return JSONResponse({"result_status": 500, "result_data": f'ERRRR response.status_code {response.status_code} response{response}'})
-                
-                except Exception as e:
-                    print(f'[{datetime.now().strftime("%Y-%m-%d %H:%M:%S")}] {e}')
-                    return f'err {str(e)}'
-                
-                
-            if req_data["vllmcontainer"] == "container_vllm_xoo": 
-                VLLM_URL = f'http://{req_data["vllmcontainer"]}:{req_data["port"]}/vllm'
-                print(f'trying request vllm with da URL: {VLLM_URL}')
-                try:
-                    response = requests.post(VLLM_URL, json={
-                        "req_type":"generate",
-                        "prompt":req_data["prompt"],
-                        "temperature":float(req_data["temperature"]),
-                        "top_p":float(req_data["top_p"]),
-                        "max_tokens":int(req_data["max_tokens"])
-                    })
-                    if response.status_code == 200:
-                        logging.info(f' [docker]  status_code: {response.status_code}') 
-                        response_json = response.json()
-                        logging.info(f' [docker]  response_json: {response_json}') 
-                        response_json["result_data"] = response_json["result_data"]
-                        return JSONResponse({"result_status": 200, "result_data": f'{response_json["result_data"]}'})
-                    else:
-                        logging.info(f' [docker] response: {response}')
-                        return JSONResponse({"result_status": 500, "result_data": f'ERRRR response.status_code {response.status_code} response{response}'})
-                
-                except Exception as e:
-                    print(f'[{datetime.now().strftime("%Y-%m-%d %H:%M:%S")}] {e}')
-                    return JSONResponse({"result_status": 500, "result_data": f'err {str(e)}'})
-            
-            return JSONResponse({"result_status": 404, "result_data": f'{req_data["vllmcontainer"]} not found!'})
+            res_generate = await vllm_generate_cached(req_data, req_data["prompt"])
+            print(f'[{datetime.now().strftime("%Y-%m-%d %H:%M:%S")}] [docker] generate status: {res_generate["result_status"]} latency: {res_generate["latency"]:.2f}s cached: {res_generate.get("cached", False)}')
+            logging.info(f' [docker] generate status: {res_generate["result_status"]} cached: {res_generate.get("cached", False)}')
+            if res_generate["result_status"] == 429:
+                # a 429 from the replica itself, not the admission queue, carries no estimate
+                retry_after = res_generate.get("retry_after", 1)
+                return JSONResponse({"result_status": 429, "result_data": f'{res_generate["result_data"]}', "retry_after": retry_after}, status_code=429, headers={"Retry-After": str(retry_after)})
+            return JSONResponse({"result_status": res_generate["result_status"], "result_data": f'{res_generate["result_data"]}'})
   
+        if req_data["method"] == "generate_batch":
+            if not isinstance(req_data.get("prompts"), list) or not req_data["prompts"]:
+                return JSONResponse({"result_status": 400, "result_data": "prompts must be a non-empty list"}, status_code=400)
+            print(f'[{datetime.now().strftime("%Y-%m-%d %H:%M:%S")}] [docker] generate_batch >>>>>>>>>>> {len(req_data["prompts"])} prompts')
+            start = time.monotonic()
+            res_batch = await vllm_generate_batch(req_data)
+            res_failed = sum(1 for res_item in res_batch if res_item["result_status"] != 200)
+            print(f'[{datetime.now().strftime("%Y-%m-%d %H:%M:%S")}] [docker] generate_batch done in {time.monotonic() - start:.2f}s ({res_failed} failed)')
+            return JSONResponse({"result_status": 200 if res_failed == 0 else 207, "result_data": res_batch})
+
+        if req_data["method"] == "generate_stream":
+            print(f'[{datetime.now().strftime("%Y-%m-%d %H:%M:%S")}] [docker] generate_stream >>>>>>>>>>>')
+            return StreamingResponse(vllm_stream(req_data), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
         if req_data["method"] == "logs":
             req_container = client.containers.get(req_data["model"])
             res_logs = req_container.logs()
@@ -1204,176 +2690,17 @@ async def fndocker(request: Request):
             return JSONResponse({"result": 200, "result_data": stats})
 
         if req_data["method"] == "list":
-            res_container_list = client.containers.list(all=True)
-            return JSONResponse([container.attrs for container in res_container_list])
+            return JSONResponse(get_container_list(all=True))
 
-        if req_data["method"] == "delete":
-            req_container = client.containers.get(req_data["model"])
-            req_container.stop()
-            req_container.remove(force=True)
-            return JSONResponse({"result": 200})
-
-        if req_data["method"] == "stop":
-            req_container = client.containers.get(req_data["model"])
-            req_container.stop()
-            return JSONResponse({"result": 200})
-
-        if req_data["method"] == "start":
-            req_container = client.containers.get(req_data["model"])
-            req_container.start()
-            return JSONResponse({"result": 200})
+        if req_data["method"] in LIFECYCLE_JOBS:
+            job_id = await job_submit(req_data["method"], req_data)
+            return JSONResponse({"result_status": 202, "result_data": {"job_id": job_id}})
 
-        if req_data["method"] == "load":
-            print(f' * ! * ! * trying to load ....  0 ')
-            # VLLM_URL = f'http://container_vllm_xoo:{os.getenv("VLLM_PORT")}/vllm'
-            # if req_data["vllmcontainer"] == "container_vllm_xoo":  ....
-            
-            print(f'  * ! * ! *  calling stop_vllm_container()')
-            res_stop_vllm_container = await stop_vllm_container()
-            print(f'  * ! * ! *  calling stop_vllm_container() -> res_stop_vllm_container -> {res_stop_vllm_container}')      
-            
-            # check if container exists with this model if yes start ..
-            if req_data["vllmcontainer"] == "container_vllm_oai":
-                return JSONResponse({"result_status": 500, "result_data": f'vllm/vllm-openai:latest load not supported!'})
-            
-            # if req_data["vllmcontainer"] == "container_vllm_xoo":
-            if req_data["vllmcontainer"]:
-                print(f'  * ! * ! *  starting container_vllm_xoo ...')
-                req_container = client.containers.get(req_data["vllmcontainer"])
-                print(f'  * ! * ! *  is started? [{datetime.now().strftime("%Y-%m-%d %H:%M:%S")}] ...')
-                req_container.start()
-                print(f'  * ! * ! *  is started? [{datetime.now().strftime("%Y-%m-%d %H:%M:%S")}] ... zzz 60 sec safety')
-                time.sleep(60)
-                print(f'  * ! * ! *  is started? [{datetime.now().strftime("%Y-%m-%d %H:%M:%S")}] ... zzz .. awake! loading ...')
-                VLLM_URL = f'http://{req_data["vllmcontainer"]}:{req_data["port"]}/vllm'
-                print(f' * ! * ! * trying to load ....  1 VLLM_URL {VLLM_URL}')
-                try:
-                    response = requests.post(VLLM_URL, json={
-                        "req_type":"load",
-                        "max_model_len":int(req_data["max_model_len"]),
-                        "tensor_parallel_size":int(req_data["tensor_parallel_size"]),
-                        "gpu_memory_utilization":float(req_data["gpu_memory_utilization"]),
-                        "model":str(req_data["model"])
-                    })
-                    print(f' * ! * ! * trying to load ....  3 response {response}')
-                    if response.status_code == 200:
-                        print(f' * ! * ! * trying to load ....  4 status_code: {response.status_code}')
-                        
-                        response_json = response.json()
-                        print(f' * ! * ! * trying to load ....  5 response_json: {response_json}')
-                        print(f' * ! * ! * trying to load ....  6 response_json["result_data"]: {response_json["result_data"]}')
-                        return JSONResponse({"result_status": 200, "result_data": f'{response_json["result_data"]}'})
-                    else:
-                        print(f' * ! * ! * trying to load .... 7 ERRRRR')
-                        return JSONResponse({"result_status": 500, "result_data": f'ERRRRRR'})
-                
-                except Exception as e:
-                        print(f' * ! * ! * trying to load .... 8 ERRRRR')
-                        return JSONResponse({"result_status": 500, "result_data": f'ERRRRRR 8'})
-
-            return JSONResponse({"result_status": 500, "result_data": f'{req_data["vllmcontainer"]} load not supported!'})
-        
-        if req_data["method"] == "create":
-            try:
-                    
-                                
-                print(f'  !!!!!  calling stop_vllm_container()')
-                res_stop_vllm_container = await stop_vllm_container()
-                print(f'  !!!!!  calling stop_vllm_container() -> res_stop_vllm_container -> {res_stop_vllm_container}')      
-                
-            
-                req_container_name = str(req_data["model"]).replace('/', '_')
-                req_container_name = req_container_name.split('_')[0]
-                ts = str(int(datetime.now().timestamp()))
-                req_container_name = f'container_vllm_{req_container_name}_{ts}'
-                
-                # req_container_name = f'container_vllm_asdf'
-                
-                print(f' !!!!! calling req_container_name: {req_container_name}')
-                
-                if req_data["image"] == "vllm/vllm-openai:latest":
-                    print(f' !!!!! create found "vllm/vllm-openai:latest" !')
-                
-                if "xoo4foo/" in req_data["image"]:
-                    print(f' !!!!! create found "xoo4foo/" !')
-                
-                
-
-                print(f' ************ calling stop_vllm_container()')
-                res_stop_vllm_container = await stop_vllm_container()
-                print(f' ************ calling stop_vllm_container() -> res_stop_vllm_container -> {res_stop_vllm_container}')      
-                
-                if req_data["image"] == "vllm/vllm-openai:latest":
-                    print(f' !!!!! create found "vllm/vllm-openai:latest" !')
-                    res_container = client.containers.run(
-                        build={"context": f'./{req_container_name}'},
-                        image=req_data["image"],
-                        runtime=req_data["runtime"],
-                        ports={
-                            f'{req_data["port"]}/tcp': ("0.0.0.0", req_data["port"])
-                        },
-                        container_name=f'{req_container_name}',
-                        volumes={
-                            "/logs": {"bind": "/logs", "mode": "rw"},
-                            "/home/cloud/.cache/huggingface": {"bind": "/root/.cache/huggingface", "mode": "rw"},
-                            "/models": {"bind": "/root/.cache/huggingface/hub", "mode": "rw"}
-                        },
-                        shm_size=f'{req_data["shm_size"]}',
-                        network=network_name,
-                        environment={
-                            "NCCL_DEBUG": "INFO"
-                        },
-                        command=[
-                            f'--model {req_data["model"]}',
-                            f'--port {req_data["port"]}',
-                            f'--tensor-parallel-size {req_data["tensor_parallel_size"]}',
-                            f'--gpu-memory-utilization {req_data["gpu_memory_utilization"]}',
-                            f'--max-model-len {req_data["max_model_len"]}'
-                        ]
-                    )
-                    container_id = res_container.id
-                    return JSONResponse({"result_status": 200, "result_data": str(container_id)})
-                
-                if "xoo4foo/" in req_data["image"]:
-                    print(f' !!!!! create found "xoo4foo/" !')
-                    print(f' !!!!! using req_container_name: {req_container_name} !')
-
-                    res_container = client.containers.run(
-                        image=req_data["image"],
-                        name=req_container_name,
-                        runtime=req_data["runtime"],
-                        shm_size=req_data["shm_size"],
-                        network=network_name,
-                        detach=True,
-                        environment={
-                            'NCCL_DEBUG': 'INFO',
-                            'VLLM_PORT': req_data["port"]
-                        },
-                        device_requests=[
-                            docker.types.DeviceRequest(count=-1, capabilities=[['gpu']])
-                        ],
-                        ports={f'{req_data["port"]}': req_data["port"]},
-                        volumes={
-                            '/logs': {'bind': '/logs', 'mode': 'rw'},
-                            '/models': {'bind': '/models', 'mode': 'rw'}
-                        },
-                        command=[
-                            "python", "app.py",
-                            "--model", req_data["model"],
-                            "--port", str(req_data["port"]),
-                            "--tensor-parallel-size", str(req_data["tensor_parallel_size"]),
-                            "--gpu-memory-utilization", str(req_data["gpu_memory_utilization"]),
-                            "--max-model-len", str(req_data["max_model_len"])
-                        ]
-                    )
-                    
-
-                    container_id = res_container.id
-                    return JSONResponse({"result_status": 200, "result_data": str(container_id)})
-                        
-            except Exception as e:
-                print(f'[{datetime.now().strftime("%Y-%m-%d %H:%M:%S")}] {e}')
-                return JSONResponse({"result_status": 500, "result_data": f'{e}'})
+        if req_data["method"] == "job":
+            res_job = await job_get(req_data["job_id"])
+            if not res_job:
+                return JSONResponse({"result_status": 404, "result_data": f'job {req_data["job_id"]} not found'})
+            return JSONResponse({"result_status": 200, "result_data": res_job})
 
     except Exception as e:
         print(f'[{datetime.now().strftime("%Y-%m-%d %H:%M:%S")}] {e}')
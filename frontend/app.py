@@ -131,9 +131,7 @@ error_vllm5 = {
 
 try:
     r = redis.Redis(host="redis", port=6379, db=0)
-    db_gpu = json.loads(r.get('db_gpu'))
-    # print(f'db_gpu: {db_gpu} {len(db_gpu)}')
-    db_gpu_data_len = len(db_gpu_data)
+    db_gpu_data_len = int(r.hget('db_gpu:meta', 'count') or 0)
 except Exception as e:
     print(f'[{datetime.now().strftime("%Y-%m-%d %H:%M:%S")}] {e}')
 
@@ -265,9 +263,12 @@ if not os.path.exists(DEFAULTS_PATH):
     logging.info(f' [START] File missing: {DEFAULTS_PATH}')
 
 with open(DEFAULTS_PATH, "r", encoding="utf-8") as f:
-    defaults_frontend = json.load(f)["frontend"]
+    defaults_all = json.load(f)
+    defaults_frontend = defaults_all["frontend"]
     logging.info(f' [START] SUCCESS! Loaded: {DEFAULTS_PATH}')
     logging.info(f' [START] {len(defaults_frontend['vllm_supported_architectures'])} supported vLLM architectures found!')
+    METRICS_SCHEMA = defaults_all["metrics"]
+    logging.info(f' [START] METRICS_SCHEMA version: {METRICS_SCHEMA["version"]}')
 
 
 
@@ -310,33 +311,167 @@ def dropdown_load_tested_models():
 
 
 
-def get_network_data():
-    try:
-        res_network_data_all = json.loads(r.get('db_network'))
-        return res_network_data_all
-    except Exception as e:
-        print(f'[{datetime.now().strftime("%Y-%m-%d %H:%M:%S")}] {e}')
-        return e
+def decode_metrics(schema_fields, raw):
+    # inverse of the backend encode_metrics, casts the hash values to the schema types
+    decoded = {}
+    for key, val in raw.items():
+        field_name = key.decode() if isinstance(key, bytes) else key
+        val = val.decode() if isinstance(val, bytes) else val
+        field_type = schema_fields.get(field_name, {}).get("type", "str")
+        if field_type == "int":
+            decoded[field_name] = int(val)
+        elif field_type == "float":
+            decoded[field_name] = float(val)
+        else:
+            decoded[field_name] = val
+    return decoded
+
+# one subscriber per frontend process keeps the latest telemetry rows in memory. the backend
+# publishes only changed rows, with a seq per source; on a gap, a reconnect or at start the
+# full snapshot is reloaded from redis. the dataframes read this snapshot, never redis
+TELEMETRY_CHANNEL = "telemetry"
+TELEMETRY_SOURCES = ["gpu", "disk", "network"]
+telemetry_lock = threading.Lock()
+telemetry_snapshot = {source: {} for source in TELEMETRY_SOURCES}
+telemetry_seq = {source: 0 for source in TELEMETRY_SOURCES}
+telemetry_version = {source: 0 for source in TELEMETRY_SOURCES}
+
+def telemetry_load():
+    pipe = r.pipeline(transaction=False)
+    pipe.hgetall('db_gpu:meta')
+    pipe.get('db_disk')
+    pipe.get('db_network')
+    pipe.hgetall('telemetry:seq')
+    gpu_meta, db_disk, db_network, res_seq = pipe.execute()
+    res_rows = {"gpu": [], "disk": [], "network": []}
+    if int(gpu_meta.get(b'version', 0)) == METRICS_SCHEMA["version"]:
+        pipe = r.pipeline(transaction=False)
+        for gpu_i in range(0,int(gpu_meta.get(b'count', 0))):
+            pipe.hgetall(f'db_gpu:{gpu_i}')
+        res_rows["gpu"] = [decode_metrics(METRICS_SCHEMA["gpu"], raw) for raw in pipe.execute() if raw]
+    else:
+        print(f'[{datetime.now().strftime("%Y-%m-%d %H:%M:%S")}] [telemetry_load] schema version mismatch: {gpu_meta.get(b"version")} != {METRICS_SCHEMA["version"]}')
+    if db_disk:
+        res_rows["disk"] = [dict(ast.literal_eval(entry["disk_info"]), disk_i=entry["disk_i"], timestamp=entry["timestamp"]) for entry in json.loads(db_disk)]
+    if db_network:
+        res_rows["network"] = json.loads(db_network)
+    return res_rows, {k.decode(): int(v) for k, v in res_seq.items()}
+
+def telemetry_resync():
+    res_rows, res_seq = telemetry_load()
+    key_fields = {"gpu": "gpu_i", "disk": "mountpoint", "network": "container"}
+    with telemetry_lock:
+        for source in TELEMETRY_SOURCES:
+            telemetry_snapshot[source] = {str(row[key_fields[source]]): row for row in res_rows[source]}
+            telemetry_seq[source] = res_seq.get(source, 0)
+            telemetry_version[source] = telemetry_version[source] + 1
+
+def telemetry_apply(message):
+    source = message["source"]
+    with telemetry_lock:
+        # seq 1 after a higher one means the backend restarted and counts from the start again
+        restarted = message["seq"] == 1 and telemetry_seq[source] > 1
+        if message["seq"] <= telemetry_seq[source] and not restarted:
+            return
+        if message["seq"] != telemetry_seq[source] + 1:
+            gap = True
+        else:
+            gap = False
+            for row in message["changed"]:
+                telemetry_snapshot[source][str(row[message["key_field"]])] = row
+            for row_key in message["removed"]:
+                telemetry_snapshot[source].pop(row_key, None)
+            telemetry_seq[source] = message["seq"]
+            telemetry_version[source] = telemetry_version[source] + 1
+    if gap:
+        telemetry_resync()
+
+def telemetry_subscriber():
+    while True:
+        try:
+            pubsub = r.pubsub(ignore_subscribe_messages=True)
+            # subscribe first so nothing published during the reload is lost
+            pubsub.subscribe(TELEMETRY_CHANNEL)
+            telemetry_resync()
+            for message in pubsub.listen():
+                telemetry_apply(json.loads(message["data"]))
+        except Exception as e:
+            print(f'[{datetime.now().strftime("%Y-%m-%d %H:%M:%S")}] [telemetry_subscriber] {e}')
+            time.sleep(1.0)
 
-def get_gpu_data():
-    try:
-        res_gpu_data_all = json.loads(r.get('db_gpu'))
-        return res_gpu_data_all
-    except Exception as e:
-        print(f'[{datetime.now().strftime("%Y-%m-%d %H:%M:%S")}] {e}')
-        return e
+threading.Thread(target=telemetry_subscriber, name="telemetry", daemon=True).start()
 
-def get_disk_data():
-    try:
-        res_disk_data_all = json.loads(r.get('db_disk'))
-        return res_disk_data_all
-    except Exception as e:
-        print(f'[{datetime.now().strftime("%Y-%m-%d %H:%M:%S")}] {e}')
-        return e
+def get_telemetry_rows(source, sort_field):
+    with telemetry_lock:
+        return sorted(telemetry_snapshot[source].values(), key=lambda row: row.get(sort_field, 0))
 
+def get_gpu_data():
+    return get_telemetry_rows("gpu", "gpu_i")
 
+def get_disk_data():
+    return get_telemetry_rows("disk", "disk_i")
 
+def get_network_data():
+    # the total row first, then nics and containers as the backend ordered them
+    return sorted(get_telemetry_rows("network", "container"), key=lambda row: row["container"] != "all")
+
+# the dataframes are built once per process and shared by all sessions. a source is rebuilt
+# at most once per TELEMETRY_CACHE_TTL and only if its snapshot changed, one thread builds
+# while the others wait for and reuse its result
+TELEMETRY_CACHE_TTL = 1.0
+telemetry_cache = {}
+telemetry_cache_locks = {source: threading.Lock() for source in TELEMETRY_SOURCES}
+
+def telemetry_cached(source, build):
+    cached = telemetry_cache.get(source)
+    if cached and (cached["version"] == telemetry_version[source] or time.monotonic() - cached["ts"] < TELEMETRY_CACHE_TTL):
+        return cached["value"]
+    with telemetry_cache_locks[source]:
+        cached = telemetry_cache.get(source)
+        if cached and (cached["version"] == telemetry_version[source] or time.monotonic() - cached["ts"] < TELEMETRY_CACHE_TTL):
+            return cached["value"]
+        # taken before the build so a change during it is picked up on the next call
+        current_version = telemetry_version[source]
+        value = build()
+        telemetry_cache[source] = {"version": current_version, "ts": time.monotonic(), "value": value}
+        return value
+
+def telemetry_tick(source, to_pd, seen_version, visible=True):
+    # nothing is sent to the session unless the source changed since its last push and the panel is open
+    current_version = telemetry_version[source]
+    if not visible or current_version == seen_version:
+        return gr.skip(), seen_version
+    value = to_pd()
+    # the shared dataframe may lag the snapshot by up to TELEMETRY_CACHE_TTL, remember the
+    # version it was built from so the newer one is still pushed on a later tick
+    return value, telemetry_cache.get(source, {}).get("version", current_version)
+
+
+
+
+
+JOB_POLL_INTERVAL = 1.0
+JOB_POLL_TIMEOUT = 900
+
+def backend_job_poll(job_id, timeout=JOB_POLL_TIMEOUT):
+    # yields the job state from the backend until the lifecycle job is done, failed or timed out
+    start = time.time()
+    while time.time() - start < timeout:
+        response = requests.post(DOCKER_API_URL, json={"method":"job","job_id":job_id}, timeout=SEARCH_REQUEST_TIMEOUT)
+        res_job = response.json()["result_data"]
+        yield res_job
+        if isinstance(res_job, dict) and res_job.get("state") in ("done", "failed"):
+            return
+        time.sleep(JOB_POLL_INTERVAL)
+    yield {"job_id": job_id, "state": "failed", "result": f'timeout after {timeout}s'}
 
+def backend_job_wait(res_json, timeout=JOB_POLL_TIMEOUT):
+    if res_json.get("result_status") != 202:
+        return res_json
+    res_job = {}
+    for res_job in backend_job_poll(res_json["result_data"]["job_id"], timeout):
+        pass
+    return res_job.get("result", res_job)
 
 def docker_api(req_method,req_var):
     try:
@@ -361,17 +496,17 @@ def docker_api(req_method,req_var):
         if req_method == "start":
             response = requests.post(DOCKER_API_URL, json={"method":req_method,"model":req_var})
             res_json = response.json()
-            return res_json
+            return backend_job_wait(res_json)
         
         if req_method == "stop":
             response = requests.post(DOCKER_API_URL, json={"method":req_method,"model":req_var})
             res_json = response.json()
-            return res_json
+            return backend_job_wait(res_json)
         
         if req_method == "delete":
             response = requests.post(DOCKER_API_URL, json={"method":req_method,"model":req_var})
             res_json = response.json()
-            return res_json
+            return backend_job_wait(res_json)
         
     except Exception as e:
         print(f'[{datetime.now().strftime("%Y-%m-%d %H:%M:%S")}] [docker_api] {e}')
@@ -1027,7 +1162,7 @@ def transcribe_audio(audio_model,audio_path,device,compute_type):
 
 
 
-def network_to_pd():       
+def network_build_pd():
     rows = []
     try:
         network_list = get_network_data()
@@ -1036,7 +1171,9 @@ def network_to_pd():
 
             rows.append({
                 "container": entry["container"],
-                "current_dl": entry["current_dl"]
+                "current_dl": entry["current_dl"],
+                "rx_rate": f'{entry.get("rx_rate", 0) / 1024:.2f} KB/s',
+                "tx_rate": f'{entry.get("tx_rate", 0) / 1024:.2f} KB/s'
             })
             
             
@@ -1052,19 +1189,47 @@ def network_to_pd():
                 "info": f'0'
         })
         df = pd.DataFrame(rows)
-        return df
+        return df,f'0'
 
 
 
-def disk_to_pd():
+def network_to_pd():
+    return telemetry_cached("network", network_build_pd)
+
+
+
+def inference_metrics_to_pd():
+    rows = []
+    try:
+        res_metrics = registry_api("inference_metrics")["result_data"]
+        for container_name, container_metrics in res_metrics.items():
+            for metric, summary in container_metrics.items():
+                if not summary["count"]:
+                    continue
+                # times in ms, token counts and rates as they are
+                scale = 1000 if metric in ("ttft", "latency", "queue_time") else 1
+                rows.append({
+                    "container": container_name,
+                    "metric": f'{metric} (ms)' if scale == 1000 else metric,
+                    "count": summary["count"],
+                    **{k: f'{v * scale:.1f}' for k, v in summary.items() if k != "count"}
+                })
+        return pd.DataFrame(rows)
+    
+    except Exception as e:
+        print(f'[{datetime.now().strftime("%Y-%m-%d %H:%M:%S")}] [inference_metrics_to_pd] {e}')
+        return pd.DataFrame(rows)
+
+
+
+def disk_build_pd():
     rows = []
     try:
         disk_list = get_disk_data()
-        for entry in disk_list:
-            disk_info = ast.literal_eval(entry['disk_info'])
+        for disk_info in disk_list:
             rows.append({                
-                "disk_i": entry.get("disk_i", "0"),
-                "timestamp": entry.get("timestamp", "0"),
+                "disk_i": disk_info.get("disk_i", "0"),
+                "timestamp": disk_info.get("timestamp", "0"),
                 "device": disk_info.get("device", "0"),
                 "usage_percent": disk_info.get("usage_percent", "0"),
                 "mountpoint": disk_info.get("mountpoint", "0"),
@@ -1074,7 +1239,11 @@ def disk_to_pd():
                 "usage_used": disk_info.get("usage_used", "0"),
                 "usage_free": disk_info.get("usage_free", "0"),                
                 "io_read_count": disk_info.get("io_read_count", "0"),
-                "io_write_count": disk_info.get("io_write_count", "0")                
+                "io_write_count": disk_info.get("io_write_count", "0"),
+                "read_rate": f'{disk_info.get("read_bytes_rate", 0) / 1024**2:.2f} MB/s',
+                "write_rate": f'{disk_info.get("write_bytes_rate", 0) / 1024**2:.2f} MB/s',
+                "iops": f'{disk_info.get("read_iops", 0):.0f}/{disk_info.get("write_iops", 0):.0f}',
+                "eta_full": f'{disk_info["eta_full"] / 60:.0f} min' if disk_info.get("eta_full") else "-"
             })
         df = pd.DataFrame(rows)
         return df
@@ -1083,47 +1252,36 @@ def disk_to_pd():
         print(f'[{datetime.now().strftime("%Y-%m-%d %H:%M:%S")}] {e}')
         logging.info(f' &&&&&& [ERROR] [disk_to_pd] GOT e {e}')
 
+def disk_to_pd():
+    return telemetry_cached("disk", disk_build_pd)
+
 disk_to_pd()
 
 
-def gpu_to_pd():
-    global MEM_TOTAL
-    global MEM_USED
-    global MEM_FREE
+def gpu_mem_util(gpu_info):
+    return f'{gpu_info.get("mem_util", 0):.2f}% ({gpu_info.get("mem_used", 0) / 1024**2:.2f} MB/{gpu_info.get("mem_total", 0) / 1024**2:.2f} MB)'
+
+def gpu_build_pd():
     rows = []
 
     try:
         gpu_list = get_gpu_data()
-        MEM_TOTAL = 0
-        MEM_USED = 0
-        MEM_FREE = 0
-        for entry in gpu_list:
-            gpu_info = ast.literal_eval(entry['gpu_info'])
-            
-            current_gpu_mem_total = gpu_info.get("mem_total", "0")
-            current_gpu_mem_used = gpu_info.get("mem_used", "0")
-            current_gpu_mem_free = gpu_info.get("mem_free", "0")
-            MEM_TOTAL = float(MEM_TOTAL) + float(current_gpu_mem_total.split()[0])
-            MEM_USED = float(MEM_USED) + float(current_gpu_mem_used.split()[0])
-            MEM_FREE = float(MEM_FREE) + float(current_gpu_mem_free.split()[0])
-            print(f'MMMMMMMMMMMMMMMMM MEM 1')
-            update_mem(gpu_info.get("mem_util", "0"))
-            print(f'MMMMMMMMMMMMMMMMM MEM 2')
-            # mmmmmmmm
+        for gpu_info in gpu_list:
+            mem_util = gpu_mem_util(gpu_info)
             rows.append({                                
                 "name": gpu_info.get("name", "0"),
-                "mem_util": gpu_info.get("mem_util", "0"),
-                "timestamp": entry.get("timestamp", "0"),
-                "fan_speed": gpu_info.get("fan_speed", "0"),
-                "temperature": gpu_info.get("temperature", "0"),
-                "gpu_util": gpu_info.get("gpu_util", "0"),
-                "power_usage": gpu_info.get("power_usage", "0"),
-                "clock_info_graphics": gpu_info.get("clock_info_graphics", "0"),
-                "clock_info_mem": gpu_info.get("clock_info_mem", "0"),                
-                "cuda_cores": gpu_info.get("cuda_cores", "0"),
-                "compute_capability": gpu_info.get("compute_capability", "0"),
+                "mem_util": mem_util,
+                "timestamp": datetime.fromtimestamp(gpu_info.get("timestamp", 0)).strftime("%Y-%m-%d %H:%M:%S"),
+                "fan_speed": f'{gpu_info.get("fan_speed", 0)}%',
+                "temperature": f'{gpu_info.get("temperature", 0)}°C',
+                "gpu_util": f'{gpu_info.get("gpu_util", 0):.0f}%',
+                "power_usage": f'{gpu_info.get("power_usage", 0):.2f} W',
+                "clock_info_graphics": f'{gpu_info.get("clock_info_graphics", 0)} MHz',
+                "clock_info_mem": f'{gpu_info.get("clock_info_mem", 0)} MHz',
+                "cuda_cores": gpu_info.get("cuda_cores", 0),
+                "compute_capability": gpu_info.get("compute_capability", 0),
                 "current_uuid": gpu_info.get("current_uuid", "0"),
-                "gpu_i": entry.get("gpu_i", "0"),
+                "gpu_i": gpu_info.get("gpu_i", 0),
                 "supported": gpu_info.get("supported", "0"),
                 "not_supported": gpu_info.get("not_supported", "0"),
                 "status": "ok"
@@ -1135,6 +1293,9 @@ def gpu_to_pd():
     except Exception as e:
         print(f'[{datetime.now().strftime("%Y-%m-%d %H:%M:%S")}] {e}')
 
+def gpu_to_pd():
+    return telemetry_cached("gpu", gpu_build_pd)
+
 gpu_to_pd()
 
 
@@ -1159,14 +1320,18 @@ gpu_to_pd()
 
 
 
+
+def registry_api(req_method, **req_params):
+    response = requests.post(REDIS_API_URL, json={"method": req_method, **req_params}, timeout=REQUEST_TIMEOUT)
+    return response.json()
 
 def redis_connection(**kwargs):
+    # vllm entries live in the backend registry (one hash per instance + index sets),
+    # this keeps the old db_name/method/select interface on top of its api
     try:
         if not kwargs:
             print(f' **REDIS: Error: no kwargs')
             return False
-        # else:
-        #     print(f' **REDIS: kwargs: {kwargs}')
         
         if not kwargs["db_name"]:
             print(f' **REDIS: Error: no db_name')
@@ -1180,11 +1345,6 @@ def redis_connection(**kwargs):
             print(f' **REDIS: Error: no select')
             return False
 
-        res_db_list = r.lrange(kwargs["db_name"], 0, -1)
-
-        # print(f' **REDIS: found {len(res_db_list)} entries!')
-        res_db_list = [json.loads(entry) for entry in res_db_list]
-        
         if kwargs["select"] == "filter":
             if not kwargs["filter_key"]:
                 print(f' **REDIS: Error: no filter_key')
@@ -1194,57 +1354,38 @@ def redis_connection(**kwargs):
                 print(f' **REDIS: Error: no filter_val')
                 return False
 
-            res_db_list = [entry for entry in res_db_list if entry[kwargs["filter_key"]] == kwargs["filter_val"]]
-            # print(f' **REDIS: filtered: {len(res_db_list)}')
+            if kwargs["filter_key"] in ["id", "uid", "vllm_id"]:
+                res_json = registry_api("registry_get", vllm_id=kwargs["filter_val"])
+                res_db_list = [res_json["result_data"]] if res_json["result_status"] == 200 else []
+            else:
+                res_json = registry_api("registry_find", filters={kwargs["filter_key"]: kwargs["filter_val"]})
+                res_db_list = res_json["result_data"] if res_json["result_status"] == 200 else []
+        else:
+            res_db_list = registry_api("registry_find")["result_data"]
         
         if kwargs["method"] == "get":
             return res_db_list
             
         if kwargs["method"] == "del_all":
             if len(res_db_list) > 0:
-                update_i = 0
-                for entry in [json.dumps(entry) for entry in res_db_list]:
-                    r.lrem(kwargs["db_name"], 0, entry)
-                    update_i = update_i + 1
+                for entry in res_db_list:
+                    registry_api("registry_delete", vllm_id=entry["vllm_id"])
                 return res_db_list
             else:
                 print(f' **REDIS: Error: no entry to delete for db_name: {kwargs["db_name"]}')
                 return False
             
-        if kwargs["method"] == "update":
-            if len(res_db_list) > 0:
-                update_i = 0
-                for entry in [json.dumps(entry) for entry in res_db_list]:
-                    r.lrem(kwargs["db_name"], 0, entry)
-                    entry = json.loads(entry)
-                    entry["ts"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                    # entry["gpu"]["mem"] = f'blablabla + {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}'
-                    r.rpush(kwargs["db_name"], json.dumps(entry))
-                    update_i = update_i + 1
-                # print(f' **REDIS: updated ({update_i}/{len(res_db_list)})!')
-                return res_db_list
-            else:
-                print(f' **REDIS: Error: no entry to update for db_name: {kwargs["db_name"]}')
-                return False
-                    
-        if kwargs["method"] == "update2":
-            print(f' ********************REDIS: "update2"')
-            if not kwargs["update_val"]:
+        if kwargs["method"] in ["update", "update2"]:
+            if kwargs["method"] == "update2" and not kwargs.get("update_val"):
                 print(f' ********************REDIS: ERROR NO "update_val"')
                 return False
-            else:
-                print(f' ********************REDIS: SUCCES GOT "update_val": {kwargs["update_val"]}')
-            
             if len(res_db_list) > 0:
-                update_i = 0
-                for entry in [json.dumps(entry) for entry in res_db_list]:
-                    r.lrem(kwargs["db_name"], 0, entry)
-                    entry = json.loads(entry)
-                    # entry["ts"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                    entry["gpu"]["mem"] = f'mmhhmm {kwargs["update_val"]} |||| {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}'
-                    r.rpush(kwargs["db_name"], json.dumps(entry))
-                    update_i = update_i + 1
-                # print(f' **REDIS: updated ({update_i}/{len(res_db_list)})!')
+                for entry in res_db_list:
+                    # the registry refreshes "ts" on every write
+                    update_data = {}
+                    if kwargs.get("update_val"):
+                        update_data["gpu"] = {**entry.get("gpu", {}), "mem": f'{kwargs["update_val"]}'}
+                    registry_api("registry_update", vllm_id=entry["vllm_id"], data=update_data)
                 return res_db_list
             else:
                 print(f' **REDIS: Error: no entry to update for db_name: {kwargs["db_name"]}')
@@ -1257,36 +1398,23 @@ def redis_connection(**kwargs):
             if not kwargs["data"]["uid"]:
                 print(f' **REDIS: Error: no uid')
                 return False
-            else:
-                print(f' **REDIS: YES GOT DATA UIDS!')
-
-                
-            # print(f' **REDIS: trying to get all uids ...')
-            curr_uids = [entry["uid"] for entry in res_db_list]
-            # print(f' **REDIS: found curr_uids: {len(curr_uids)}')
-
-            if kwargs["data"]["uid"] in curr_uids:
-                print(f' **REDIS: Error: vllm already saved!')
-                return False
 
-            
             save_data = kwargs["data"]
-            
-            
-            # bbbbb
             data_obj = {
                 "container_name": save_data.get("container_name", "err_container_name"),
                 "uid": save_data.get("uid", "00000000000"),
+                "status": save_data.get("status", "running"),
                 "State": {
-                    "Status": "running"
+                    "Status": save_data.get("State", {}).get("Status", "running")
                 },
                 "gpu": {
                     "mem": save_data.get("gpu", {}).get("mem", "err_gpu_mem")
-                },
-                "ts": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            }        
-            r.rpush(kwargs["db_name"], json.dumps(data_obj))
-            # print(f' **REDIS: saved!')
+                }
+            }
+            res_json = registry_api("registry_create", vllm_id=save_data["uid"], data=data_obj)
+            if res_json["result_status"] == 409:
+                print(f' **REDIS: Error: vllm already saved!')
+                return False
             return res_db_list
         
         return False
@@ -1303,7 +1431,6 @@ def redis_connection(**kwargs):
 
 
 
-
 # test_call_save_vllm4 = {
 #                 "db_name": REDIS_DB_VLLM,
 #                 "method": "save",
@@ -1565,6 +1692,35 @@ def update_mem(new_mem):
     res_redis = redis_connection(**test_call_update2)
     return res_redis
 
+# keeps MEM_* and the mem entry in REDIS_DB_VLLM in step with the gpu snapshot, off the
+# render path so it runs once per change instead of once per gpu, session and tick
+def gpu_mem_sync():
+    global MEM_TOTAL
+    global MEM_USED
+    global MEM_FREE
+    seen_version = -1
+    last_mem_util = None
+    while True:
+        try:
+            current_version = telemetry_version["gpu"]
+            if current_version != seen_version:
+                gpu_list = get_gpu_data()
+                # MEM_* are kept in MB
+                MEM_TOTAL = sum(gpu_info.get("mem_total", 0) for gpu_info in gpu_list) / 1024**2
+                MEM_USED = sum(gpu_info.get("mem_used", 0) for gpu_info in gpu_list) / 1024**2
+                MEM_FREE = sum(gpu_info.get("mem_free", 0) for gpu_info in gpu_list) / 1024**2
+                # every gpu wrote the same entry before, the last one is what it ended up holding
+                mem_util = gpu_mem_util(gpu_list[-1]) if gpu_list else None
+                if mem_util is not None and mem_util != last_mem_util:
+                    update_mem(mem_util)
+                    last_mem_util = mem_util
+                seen_version = current_version
+        except Exception as e:
+            print(f'[{datetime.now().strftime("%Y-%m-%d %H:%M:%S")}] [gpu_mem_sync] {e}')
+        time.sleep(1.0)
+
+threading.Thread(target=gpu_mem_sync, name="gpu_mem_sync", daemon=True).start()
+
     
 # def add_vllm4():
 #     print(f'trying to uadd_vllm4 ...')
@@ -1864,15 +2020,22 @@ def llm_load(*params):
             logging.exception(f'[llm_load] >> got response == 200 building json ...  {response} ')
             res_json = response.json()        
             print(f' [llm_load] >> GOT RES_JSON: SELECTED_MODEL_ID: {res_json} ')         
-            return f'{res_json}'
+            if res_json.get("result_status") != 202:
+                yield f'{res_json}'
+                return
+            for res_job in backend_job_poll(res_json["result_data"]["job_id"]):
+                if res_job.get("state") in ("done", "failed"):
+                    yield f'{res_job.get("result")}'
+                else:
+                    yield f'[{res_job.get("state")}] {res_job.get("progress", "")}'
         else:
             logging.exception(f'[llm_load] Request Error: {response}')
-            return f'Request Error: {response}'
+            yield f'Request Error: {response}'
     
     except Exception as e:
         logging.exception(f'Exception occured: {e}', exc_info=True)
         print(f'[{datetime.now().strftime("%Y-%m-%d %H:%M:%S")}] {e}')
-        return f'{e}'
+        yield f'{e}'
         
     
 def llm_create(*params):
@@ -1904,15 +2067,22 @@ def llm_create(*params):
             logging.exception(f'[llm_create] >> got response == 200 building json ...  {response} ')
             res_json = response.json()        
             print(f' [llm_create] >> GOT RES_JSON: SELECTED_MODEL_ID: {res_json} ')         
-            return f'{res_json}'
+            if res_json.get("result_status") != 202:
+                yield f'{res_json}'
+                return
+            for res_job in backend_job_poll(res_json["result_data"]["job_id"]):
+                if res_job.get("state") in ("done", "failed"):
+                    yield f'{res_job.get("result")}'
+                else:
+                    yield f'[{res_job.get("state")}] {res_job.get("progress", "")}'
         else:
             logging.exception(f'[llm_create] Request Error: {response}')
-            return f'Request Error: {response}'
+            yield f'Request Error: {response}'
     
     except Exception as e:
         logging.exception(f'Exception occured: {e}', exc_info=True)
         print(f'[{datetime.now().strftime("%Y-%m-%d %H:%M:%S")}] {e}')
-        return f'{e}'
+        yield f'{e}'
     
         
 def llm_prompt(*params):
@@ -1937,7 +2107,7 @@ def llm_prompt(*params):
         }
 
         response = requests.post(BACKEND_URL, json={
-            "method":"generate",
+            "method":"generate_stream",
             "model":SELECTED_MODEL_ID,
             "vllmcontainer":getattr(req_params, "vllmcontainer", DEFAULTS_PROMPT["vllmcontainer"]),
             "port":getattr(req_params, "port", DEFAULTS_PROMPT["port"]),
@@ -1945,27 +2115,33 @@ def llm_prompt(*params):
             "top_p":getattr(req_params, "top_p", DEFAULTS_PROMPT["top_p"]),
             "temperature":getattr(req_params, "temperature", DEFAULTS_PROMPT["temperature"]),
             "max_tokens":getattr(req_params, "max_tokens", DEFAULTS_PROMPT["max_tokens"])
-        }, timeout=REQUEST_TIMEOUT)
+        }, stream=True, timeout=REQUEST_TIMEOUT)
 
-        if response.status_code == 200:
-            print(f' !?!?!?!? [llm_prompt] got response == 200 building json ... {response} ')
-            logging.info(f'!?!?!?!? [llm_prompt] got response == 200 building json ...  {response} ')
-            res_json = response.json()        
-            print(f' !?!?!?!? [llm_prompt] GOT RES_JSON: llm_prompt SELECTED_MODEL_ID: {res_json} ')
-            logging.info(f'!?!?!?!? [llm_prompt] GOT RES_JSON: {res_json} ')
-            if res_json["result_status"] != 200:
-                print(f' !?!?!?!? [llm_prompt] res_json["result_status"] != 200: {res_json} ')
-                logging.exception(f'[llm_prompt] Response Error: {res_json["result_data"]}')
-                return f'{res_json}'
-            return f'{res_json["result_data"]}'
-        else:
+        if response.status_code != 200:
             logging.exception(f'[llm_prompt] Request Error: {response}')
-            return f'Request Error: {response}'
+            yield f'Request Error: {response}'
+            return
+
+        res_text = ""
+        with response:
+            for line in response.iter_lines(decode_unicode=True):
+                if not line or not line.startswith("data:"):
+                    continue
+                chunk_data = line[len("data:"):].strip()
+                if chunk_data == "[DONE]":
+                    break
+                chunk_json = json.loads(chunk_data)
+                if "error" in chunk_json:
+                    logging.exception(f'[llm_prompt] Response Error: {chunk_json["error"]}')
+                    yield f'{res_text}\n\n[error] {chunk_json["error"]}' if res_text else f'{chunk_json["error"]}'
+                    return
+                res_text += chunk_json.get("delta", "")
+                yield res_text
     
     except Exception as e:
         logging.exception(f'Exception occured: {e}', exc_info=True)
         print(f'[{datetime.now().strftime("%Y-%m-%d %H:%M:%S")}] {e}')
-        return f'{e}'
+        yield f'{e}'
     
 
 
@@ -2536,7 +2712,7 @@ def create_app():
             with gr.Accordion(("Prompt Parameters"), open=False, visible=True) as acc_prompt:
                                     
                 global PROMPT
-                vllmcontainer=gr.Radio(["container_vllm_xoo", "container_vllm_oai", "Create New"], value="container_vllm_oai", show_label=False, info="Select a vllms_prompt or create a new one. Where?"),
+                vllmcontainer=gr.Radio(["auto", "container_vllm_xoo", "container_vllm_oai", "Create New"], value="container_vllm_oai", show_label=False, info="Select a vllms_prompt or create a new one. auto routes to the least busy replica of the selected model."),
                 port=gr.Slider(1370, 1380, step=1, value=1371, label="port", info=f"Choose a port."),
                 prompt = gr.Textbox(placeholder=f'{PROMPT}', value=f'{PROMPT}', label="Prompt", show_label=True, visible=True),
                 top_p=gr.Slider(0.01, 1.0, step=0.01, value=0.95, label="top_p", info=f'Float that controls the cumulative probability of the top tokens to consider'),
@@ -2663,7 +2839,7 @@ def create_app():
                         with gr.Accordion(("Prompt Parameters"), open=True, visible=True) as acc_prompt:
 
                             llm_prompt_components = PromptComponents(
-                                vllmcontainer=gr.Radio(["container_vllm_xoo", "container_vllm_oai", "Create New"], value="container_vllm_oai", show_label=False, info="Select a vllms_prompt or create a new one. Where?"),
+                                vllmcontainer=gr.Radio(["auto", "container_vllm_xoo", "container_vllm_oai", "Create New"], value="container_vllm_oai", show_label=False, info="Select a vllms_prompt or create a new one. auto routes to the least busy replica of the selected model."),
                                 port=gr.Slider(1370, 1380, step=1, value=1371, label="port", info=f"Choose a port."),
                                 prompt = gr.Textbox(placeholder=f'{PROMPT}', value=f'{PROMPT}', label="Prompt", show_label=True, visible=True),
                                 top_p=gr.Slider(0.01, 1.0, step=0.01, value=0.95, label="top_p", info=f'Float that controls the cumulative probability of the top tokens to consider'),
@@ -2679,6 +2855,9 @@ def create_app():
                             output_prompt = gr.Textbox(label="Prompt Output", lines=4, show_label=True)
                         with gr.Row() as vllm_prompt:
                             prompt_btn = gr.Button("PROMPT")
+                        with gr.Accordion(("Inference Metrics"), open=False, visible=True) as acc_inference_metrics:
+                            inference_metrics_dataframe = gr.Dataframe(show_label=False)
+                            inference_metrics_btn = gr.Button("Refresh")
 
         
         
@@ -3213,14 +3392,48 @@ def create_app():
                 
 
 
-        disk_timer = gr.Timer(1,active=True)
-        disk_timer.tick(disk_to_pd, outputs=disk_dataframe)
+        # the gpu and disk timers only run while their panel is open, the network timer
+        # also feeds kekw so it keeps running and skips the dataframe while it is hidden
+        stats_open = gr.State(False)
+        gpu_open = gr.State(False)
+        disk_open = gr.State(False)
+        network_open = gr.State(False)
+        gpu_seen = gr.State(-1)
+        disk_seen = gr.State(-1)
+        network_seen = gr.State(-1)
+        current_dl_seen = gr.State(None)
+
+        disk_timer = gr.Timer(1,active=False)
+        disk_timer.tick(lambda seen: telemetry_tick("disk", disk_to_pd, seen), inputs=disk_seen, outputs=[disk_dataframe,disk_seen])
+
+        gpu_timer = gr.Timer(1,active=False)
+        gpu_timer.tick(lambda seen: telemetry_tick("gpu", gpu_to_pd, seen), inputs=gpu_seen, outputs=[gpu_dataframe,gpu_seen])
 
-        gpu_timer = gr.Timer(1,active=True)
-        gpu_timer.tick(gpu_to_pd, outputs=gpu_dataframe)
+        def network_tick(seen, current_dl_last, stats_visible, network_visible):
+            network_df, current_dl = network_to_pd()
+            network_update, seen = telemetry_tick("network", lambda: network_df, seen, stats_visible and network_visible)
+            current_dl_update = gr.skip() if current_dl == current_dl_last else current_dl
+            return network_update, current_dl_update, seen, current_dl
 
         network_timer = gr.Timer(1,active=True)
-        network_timer.tick(network_to_pd, outputs=[network_dataframe,kekw])
+        network_timer.tick(network_tick, inputs=[network_seen,current_dl_seen,stats_open,network_open], outputs=[network_dataframe,kekw,network_seen,current_dl_seen])
+
+        # reopening a panel resets its seen version so it gets the current data at once
+        acc_system_stats.expand(lambda gpu_o, disk_o: (True, gr.Timer(active=gpu_o), gr.Timer(active=disk_o), -1, -1, -1), inputs=[gpu_open,disk_open], outputs=[stats_open,gpu_timer,disk_timer,gpu_seen,disk_seen,network_seen])
+        acc_system_stats.collapse(lambda: (False, gr.Timer(active=False), gr.Timer(active=False)), outputs=[stats_open,gpu_timer,disk_timer])
+        acc_gpu_dataframe.expand(lambda: (True, gr.Timer(active=True), -1), outputs=[gpu_open,gpu_timer,gpu_seen])
+        acc_gpu_dataframe.collapse(lambda: (False, gr.Timer(active=False)), outputs=[gpu_open,gpu_timer])
+        acc_disk_dataframe.expand(lambda: (True, gr.Timer(active=True), -1), outputs=[disk_open,disk_timer,disk_seen])
+        acc_disk_dataframe.collapse(lambda: (False, gr.Timer(active=False)), outputs=[disk_open,disk_timer])
+        acc_network_dataframe.expand(lambda: (True, -1), outputs=[network_open,network_seen])
+        acc_network_dataframe.collapse(lambda: False, outputs=network_open)
+
+        inference_metrics_btn.click(inference_metrics_to_pd, outputs=inference_metrics_dataframe)
+        # polls the backend only while the accordion is open, opening it refreshes at once
+        inference_metrics_timer = gr.Timer(10,active=False)
+        inference_metrics_timer.tick(inference_metrics_to_pd, outputs=inference_metrics_dataframe)
+        acc_inference_metrics.expand(lambda: (gr.Timer(active=True), inference_metrics_to_pd()), outputs=[inference_metrics_timer,inference_metrics_dataframe])
+        acc_inference_metrics.collapse(lambda: gr.Timer(active=False), outputs=inference_metrics_timer)
 
 
     return app